@@ -57,6 +57,7 @@ class NGramGraphCollectorBase(GraphCollector):
         deep_copy=False,
         commutative=True,
         distributional=True,
+        max_edges=None,
     ):
         super().__init__(similarity_metric)
 
@@ -64,6 +65,10 @@ class NGramGraphCollectorBase(GraphCollector):
         self._n = n
         self._window_size = window_size
 
+        # keep only the heaviest edges of the graphs
+        # and of the representative graph, if given
+        self._max_edges = max_edges
+
         self._commutative = commutative
         self._distributional = distributional
 
@@ -96,7 +101,9 @@ class NGramGraphCollectorBase(GraphCollector):
         return self._appropriateness_of_graph(graph)
 
     def _construct_graph(self, data, *args, **kwargs):
-        return DocumentNGramGraph(self._n, self._window_size, data)
+        return DocumentNGramGraph(
+            self._n, self._window_size, data, max_edges=self._max_edges
+        )
 
     def _add_graph(self, graph):
         """Adds the graph input to the representative graph."""
@@ -124,6 +131,9 @@ class NGramGraphCollectorBase(GraphCollector):
                 self._representative_graph, graph, dc=self._deep_copy
             )
 
+        if self._max_edges is not None:
+            self._representative_graph.trim(self._max_edges)
+
         logging.debug(
             "Incrementing the number of documents to %02d", self._number_of_docs
         )
@@ -140,7 +150,13 @@ class NGramGraphCollectorBase(GraphCollector):
 
 class NGramGraphCollector(NGramGraphCollectorBase):
     def __init__(
-        self, n=3, window_size=3, deep_copy=False, commutative=True, distributional=True
+        self,
+        n=3,
+        window_size=3,
+        deep_copy=False,
+        commutative=True,
+        distributional=True,
+        max_edges=None,
     ):
         super().__init__(
             SimilarityNVS(),
@@ -149,6 +165,7 @@ class NGramGraphCollector(NGramGraphCollectorBase):
             deep_copy=deep_copy,
             commutative=commutative,
             distributional=distributional,
+            max_edges=max_edges,
         )
 
 
@@ -161,6 +178,7 @@ class ArrayGraph2DCollector(NGramGraphCollector):
         commutative=True,
         distributional=True,
         stride=1,
+        max_edges=None,
     ):
         super().__init__(
             n=n,
@@ -168,6 +186,7 @@ class ArrayGraph2DCollector(NGramGraphCollector):
             deep_copy=deep_copy,
             commutative=commutative,
             distributional=distributional,
+            max_edges=max_edges,
         )
 
         self._stride = stride
@@ -176,10 +195,13 @@ class ArrayGraph2DCollector(NGramGraphCollector):
         return "{0}, stride: {1}".format(super().__str__(), self._stride)
 
     def _construct_graph(self, data, *args, **kwargs):
-        return ArrayGraph2D(data, self._window_size, stride=self._stride).as_graph(
-            DocumentNGramGraph, self._n, self._window_size
+        graph = ArrayGraph2D(data, self._window_size, stride=self._stride).as_graph(
+            DocumentNGramGraph, self._n, self._window_size, max_edges=self._max_edges
         )
 
+        # (edges are added one by one, so they are only capped here)
+        return graph.trim()
+
 
 class HPG2DCollectorBase(GraphCollector):
     def __init__(
@@ -10,7 +10,12 @@
  Created on May 24, 2017, 3:56 PM
 """
 
+import collections
+import concurrent.futures
 import logging
+import sys
+
+import numpy as np
 
 from pyinsect.documentModel.comparators.Operator import BinaryOperator
 
@@ -41,6 +46,14 @@ class Similarity(BinaryOperator):
     def getSimilarityFromComponents(self, Dict):
         return 0.0
 
+    # given two ngram graphs and a threshold
+    # returns their similarity if it is at least
+    # threshold, or else None: subclasses may
+    # tell so without computing it in full
+    def similarity_at_least(self, ngg1, ngg2, threshold):
+        similarity = self.getSimilarityDouble(ngg1, ngg2)
+        return similarity if similarity >= threshold else None
+
     def apply(self, *args, **kwargs):
         return self.getSimilarityDouble(*args)
 
@@ -55,13 +68,7 @@ class SimilaritySS(Similarity):
     def getSimilarityDouble(self, ngg1, ngg2):
         # WRONG
         # return (min(ngg1.minW(),ngg2.minW())*1.0)/max(ngg1.maxW(),ngg2.maxW())
-        y = max(ngg1.number_of_edges(), ngg2.number_of_edges())
-        if y == 0:  # If both graphs are zero sized
-            return 0.0  # return zero
-
-        return (min(ngg1.number_of_edges(), ngg2.number_of_edges()) * 1.0) / max(
-            ngg1.number_of_edges(), ngg2.number_of_edges()
-        )
+        return size_similarity(ngg1.number_of_edges(), ngg2.number_of_edges())
 
     # given two ngram graphs
     # returns the SS-similarity
@@ -84,25 +91,17 @@ class SimilarityVS(Similarity):
     # given two ngram graphs
     # returns the VS-similarity as double
     def getSimilarityDouble(self, ngg1, ngg2):
-        s = 0.0
-        g1 = ngg1.getGraph()
-        g2 = ngg2.getGraph()
-        ne1 = g1.number_of_edges()
-        ne2 = g2.number_of_edges()
-
-        if ne1 == ne2 == 0:
-            return 1.0
-
-        if ne1 > ne2:
-            t = g2
-            g2 = g1
-            g1 = t
-        edges2 = set(g2.edges())  # Use set to speed up finding
-        for (u, v, d) in g1.edges(data=True):
-            if (u, v) in edges2:
-                dp = g2.get_edge_data(u, v)
-                s += min(d["weight"], dp["weight"]) / max(d["weight"], dp["weight"])
-        return s / max(g1.number_of_edges(), g2.number_of_edges())
+        return _value_similarity(ngg1, ngg2)
+
+    # VS is at most the ratio of the edge counts and,
+    # walking the edges, at most what it has summed so
+    # far plus an edge's worth for every edge left
+    def similarity_at_least(self, ngg1, ngg2, threshold):
+        if _edges_similarity(ngg1, ngg2) < threshold:
+            return None
+
+        VS = _value_similarity(ngg1, ngg2, threshold)
+        return VS if VS is not None and VS >= threshold else None
 
     # given two ngram graphs
     # returns the VS-similarity
@@ -125,27 +124,32 @@ class SimilarityNVS(Similarity):
     # given two ngram graphs
     # returns the NVS-similarity as double
     def getSimilarityDouble(self, ngg1, ngg2):
-        SS = SimilaritySS()
-        VS = SimilarityVS()
-
-        try:
-            return (VS.getSimilarityDouble(ngg1, ngg2) * 1.0) / SS.getSimilarityDouble(
-                ngg1, ngg2
-            )
-        except ZeroDivisionError:
-            return 0.0
+        return self.getSimilarityComponents(ngg1, ngg2)["NVS"]
 
     # given two ngram graphs
     # returns the NVS-similarity
-    # components e.g. SS and VS
-    # on a dictionary
+    # and its components, SS and VS,
+    # on a dictionary, from a single
+    # walk over the edges
     def getSimilarityComponents(self, ngg1, ngg2):
-        SS = SimilaritySS()
-        VS = SimilarityVS()
-        return {
-            "SS": SS.getSimilarityDouble(ngg1, ngg2),
-            "VS": VS.getSimilarityDouble(ngg1, ngg2),
-        }
+        SS = size_similarity(ngg1.number_of_edges(), ngg2.number_of_edges())
+        VS = _value_similarity(ngg1, ngg2)
+        return {"SS": SS, "VS": VS, "NVS": VS / SS if SS else 0.0}
+
+    # NVS reaches threshold when VS reaches threshold * SS,
+    # see SimilarityVS.similarity_at_least
+    def similarity_at_least(self, ngg1, ngg2, threshold):
+        SS = size_similarity(ngg1.number_of_edges(), ngg2.number_of_edges())
+        if not SS:
+            return 0.0 if threshold <= 0 else None
+
+        if _edges_similarity(ngg1, ngg2) < threshold * SS:
+            return None
+
+        VS = _value_similarity(ngg1, ngg2, threshold * SS)
+        if VS is None or VS / SS < threshold:
+            return None
+        return VS / SS
 
     # given a dictionary containing
     # SS similarity and VS similarity
@@ -164,12 +168,23 @@ class SimilarityHPG(Similarity):
     Given two HPGs, the `Value Similarity` of every sub-graph pair is computed,
     on a pair level basis, and the weighted mean of among all levels is considered
     the HPGs Value Similarity.
+
+    With an `executor` (e.g. a `concurrent.futures.ThreadPoolExecutor`, or a
+    process pool for picklable graphs and metrics), the levels are compared
+    concurrently.  `similarity_at_least` and `is_at_least` stop comparing
+    levels as soon as the ones left cannot move the mean across their
+    threshold, assuming the per level similarities lie in `level_range`
+    (as SS and VS do; NVS may exceed 1 for graphs of very different density).
     """
 
-    def __init__(self, per_level_similarity_metric):
+    def __init__(
+        self, per_level_similarity_metric, executor=None, level_range=(0.0, 1.0)
+    ):
         super().__init__()
 
         self._per_level_similarity_metric = per_level_similarity_metric
+        self._executor = executor
+        self._level_range = level_range
 
     def getSimilarityDouble(self, document_n_gram_h_graph1, document_n_gram_h_graph2):
         if not document_n_gram_h_graph1 and not document_n_gram_h_graph2:
@@ -188,18 +203,55 @@ class SimilarityHPG(Similarity):
             )
             return 0
 
-        lvls, similarity = [], 0
+        levels = self._levels(document_n_gram_h_graph1, document_n_gram_h_graph2)
+
+        metric = self._per_level_similarity_metric
+        if self._executor is None:
+            similarities = [
+                metric.getSimilarityDouble(current_1, current_2)
+                for _, current_1, current_2 in levels
+            ]
+        else:
+            futures = [
+                self._executor.submit(metric.getSimilarityDouble, current_1, current_2)
+                for _, current_1, current_2 in levels
+            ]
+            similarities = [future.result() for future in futures]
+
+        return self._mean(levels, similarities)
+
+    # given two HPGs and a threshold
+    # returns their similarity if it is at least
+    # threshold, or else None, leaving out the
+    # levels once it can no longer reach it
+    def similarity_at_least(
+        self, document_n_gram_h_graph1, document_n_gram_h_graph2, threshold
+    ):
+        reached, similarity = self._bounded(
+            document_n_gram_h_graph1, document_n_gram_h_graph2, threshold, True
+        )
+        return similarity if reached else None
+
+    # given two HPGs and a threshold
+    # returns whether their similarity is at least
+    # threshold, leaving out the levels as soon as
+    # it is decided either way
+    def is_at_least(
+        self, document_n_gram_h_graph1, document_n_gram_h_graph2, threshold
+    ):
+        reached, _ = self._bounded(
+            document_n_gram_h_graph1, document_n_gram_h_graph2, threshold, False
+        )
+        return reached
+
+    # the (level, current_1, current_2) of the levels that are
+    # not both empty
+    def _levels(self, document_n_gram_h_graph1, document_n_gram_h_graph2):
+        levels = []
 
         for lvl, (current_1, current_2) in enumerate(
             zip(document_n_gram_h_graph1, document_n_gram_h_graph2), start=1
         ):
-            logger.debug(
-                "Calculating similarity of graphs %s and %s on level %02d",
-                current_1,
-                current_2,
-                lvl,
-            )
-
             if not current_1 and not current_2:
                 # NOTE: In the context a multi-level HPG, it is highly probable that,
                 # one or more sub-graph might degenerate to empty graphs.
@@ -219,12 +271,17 @@ class SimilarityHPG(Similarity):
                 logger.debug("Both %s and %s graphs are empty", current_1, current_2)
                 continue
 
-            current_lvl_similarity = (
-                self._per_level_similarity_metric.getSimilarityDouble(
-                    current_1, current_2
-                )
-            )
+            levels.append((lvl, current_1, current_2))
 
+        return levels
+
+    # the level weighted mean of the similarities of the levels
+    def _mean(self, levels, similarities):
+        lvls, similarity = [], 0
+
+        for (lvl, current_1, current_2), current_lvl_similarity in zip(
+            levels, similarities
+        ):
             logger.debug(
                 "The similarity of graphs %s and %s is %05.3f",
                 current_1,
@@ -233,14 +290,426 @@ class SimilarityHPG(Similarity):
             )
 
             similarity += lvl * current_lvl_similarity
+            lvls.append(lvl)
 
-            logger.debug(
-                "The overall similarity of graph %s and graph %s is %05.3f",
-                document_n_gram_h_graph1,
-                document_n_gram_h_graph2,
-                (similarity / sum(lvls)) if lvls else 0,
+        return similarity / sum(lvls) if lvls else 0
+
+    # whether the similarity of two HPGs is at least threshold,
+    # along with the similarity if exact is set and it is (or
+    # else None), comparing the heaviest levels first
+    def _bounded(
+        self, document_n_gram_h_graph1, document_n_gram_h_graph2, threshold, exact
+    ):
+        if not document_n_gram_h_graph1 or not document_n_gram_h_graph2:
+            similarity = self.getSimilarityDouble(
+                document_n_gram_h_graph1, document_n_gram_h_graph2
             )
+            return similarity >= threshold, similarity
+
+        levels = self._levels(document_n_gram_h_graph1, document_n_gram_h_graph2)
+        if not levels:
+            return 0 >= threshold, 0
+
+        lowest, highest = self._level_range
+        # (less a margin for rounding, so that levels are only
+        # left out when the exact mean could not reach threshold)
+        needed = threshold * sum(lvl for lvl, _, _ in levels) * (1 - 1e-9)
+
+        metric = self._per_level_similarity_metric
+        similarities = {}
+        left = sum(lvl for lvl, _, _ in levels)
+        total = 0
+
+        if self._executor is None:
+            for lvl, current_1, current_2 in sorted(levels, reverse=True):
+                left -= lvl
+
+                # the least this level may score for the mean to
+                # still reach threshold
+                least = (needed - total - left * highest) / lvl
+                if least > lowest:
+                    similarity = metric.similarity_at_least(current_1, current_2, least)
+                    if similarity is None:
+                        return False, None
+                else:
+                    similarity = metric.getSimilarityDouble(current_1, current_2)
+
+                similarities[lvl] = similarity
+                total += lvl * similarity
+
+                if not exact and total + left * lowest >= needed:
+                    return True, None
+        else:
+            futures = {
+                self._executor.submit(
+                    metric.getSimilarityDouble, current_1, current_2
+                ): lvl
+                for lvl, current_1, current_2 in sorted(levels, reverse=True)
+            }
+
+            try:
+                for future in concurrent.futures.as_completed(futures):
+                    lvl = futures[future]
+                    left -= lvl
+
+                    similarities[lvl] = future.result()
+                    total += lvl * similarities[lvl]
+
+                    if total + left * highest < needed:
+                        return False, None
+                    if not exact and total + left * lowest >= needed:
+                        return True, None
+            finally:
+                for future in futures:
+                    future.cancel()
+
+        similarity = self._mean(levels, [similarities[lvl] for lvl, _, _ in levels])
+        if similarity < threshold:
+            return False, None
+        return True, similarity
+
+
+class SimilarityMultiRank(Similarity):
+    """The similarity of two `MultiRankNGramGraph`s.
+
+    The per rank similarity (`SimilarityNVS` by default) of the graphs of
+    every rank both hold is combined into their weighted mean.  `weights`
+    maps ranks to weights and defaults to the rank itself, favouring the
+    more specific, longer n-grams as `SimilarityHPG` favours higher levels.
+    Ranks whose graphs are both empty are ignored.
+    """
 
-            lvls.append(lvl)
+    def __init__(self, per_rank_similarity_metric=None, weights=None):
+        super().__init__()
 
-        return similarity / sum(lvls) if lvls else 0
+        if per_rank_similarity_metric is None:
+            per_rank_similarity_metric = SimilarityNVS()
+
+        self._per_rank_similarity_metric = per_rank_similarity_metric
+        self._weights = weights
+
+    def _weight(self, n):
+        if self._weights is None:
+            return n
+        return self._weights.get(n, 0)
+
+    # given two multi rank graphs
+    # returns the similarity of each of their ranks
+    def getSimilarityComponents(self, multi_rank_graph1, multi_rank_graph2):
+        components = {}
+
+        for n in multi_rank_graph1.ranks:
+            if n not in multi_rank_graph2.ranks:
+                continue
+
+            graph1, graph2 = multi_rank_graph1[n], multi_rank_graph2[n]
+
+            if not graph1 and not graph2:
+                logger.debug("Both graphs of rank %02d are empty", n)
+                continue
+
+            components[n] = self._per_rank_similarity_metric.getSimilarityDouble(
+                graph1, graph2
+            )
+
+        return components
+
+    # combines the similarities of the ranks
+    def getSimilarityFromComponents(self, Dict):
+        weights = sum(self._weight(n) for n in Dict)
+        if not weights:
+            return 0.0
+
+        return sum(self._weight(n) * value for n, value in Dict.items()) / weights
+
+    def getSimilarityDouble(self, multi_rank_graph1, multi_rank_graph2):
+        return self.getSimilarityFromComponents(
+            self.getSimilarityComponents(multi_rank_graph1, multi_rank_graph2)
+        )
+
+
+class SimilarityCache(object):
+    """A least recently used cache of similarities.
+
+    Holds at most `max_size` entries and, with `max_bytes`, at most about
+    that many bytes of keys and values (as measured by `sys.getsizeof`);
+    the least recently used entries are evicted first.  `hits` and
+    `misses` count the lookups that found an entry and those that did not.
+    A cache may be shared by any number of `CachedSimilarity` metrics.
+    """
+
+    def __init__(self, max_size=65536, max_bytes=None):
+        self._max_size = max_size
+        self._max_bytes = max_bytes
+
+        self._entries = collections.OrderedDict()
+        self._nbytes = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __str__(self):
+        return "entries: {0}, bytes: {1}, hits: {2}, misses: {3}".format(
+            len(self), self._nbytes, self.hits, self.misses
+        )
+
+    def __repr__(self):
+        return '<{0} "{1}">'.format(self.__class__.__name__, str(self))
+
+    @property
+    def nbytes(self):
+        return self._nbytes
+
+    def get(self, key, default=None):
+        value = self._entries.get(key, self)
+        if value is self:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        if key in self._entries:
+            self._nbytes -= _entry_size(key, self._entries.pop(key))
+
+        self._entries[key] = value
+        self._nbytes += _entry_size(key, value)
+
+        while self._entries and (
+            (self._max_size is not None and len(self._entries) > self._max_size)
+            or (self._max_bytes is not None and self._nbytes > self._max_bytes)
+        ):
+            self._nbytes -= _entry_size(*self._entries.popitem(last=False))
+
+    def clear(self):
+        self._entries.clear()
+        self._nbytes = 0
+
+
+class CachedSimilarity(Similarity):
+    """Memoizes the similarities given by another `Similarity`.
+
+    Results are kept in `cache` (a new `SimilarityCache` by default) under
+    the metric and the `fingerprint` of both graphs, in either order if
+    the metric is commutative.  As graphs keep their fingerprint up to
+    date on `setEdge`, `delEdge`, `union` and the like, a mutated graph is
+    looked up under its new fingerprint; graphs changed behind their back
+    (e.g. through the `networkx` graph of `getGraph`) must not be cached.
+    Arguments without a fingerprint (e.g. the level lists of HPGs) are
+    passed through to the metric.
+    """
+
+    def __init__(self, metric, cache=None):
+        super().__init__(metric._commutative, metric._distributional)
+
+        self._metric = metric
+        self._cache = SimilarityCache() if cache is None else cache
+
+    @property
+    def metric(self):
+        return self._metric
+
+    @property
+    def cache(self):
+        return self._cache
+
+    # the cache key of a pair of graphs, or None if
+    # either of them has no fingerprint
+    def _key(self, kind, ngg1, ngg2):
+        fingerprint1 = _graph_fingerprint(ngg1)
+        fingerprint2 = _graph_fingerprint(ngg2)
+        if fingerprint1 is None or fingerprint2 is None:
+            return None
+
+        if self._commutative and fingerprint2[0] < fingerprint1[0]:
+            fingerprint1, fingerprint2 = fingerprint2, fingerprint1
+
+        return (self._metric, kind, fingerprint1, fingerprint2)
+
+    def _cached(self, kind, compute, ngg1, ngg2):
+        key = self._key(kind, ngg1, ngg2)
+        if key is None:
+            return compute(ngg1, ngg2)
+
+        value = self._cache.get(key)
+        if value is None:
+            value = compute(ngg1, ngg2)
+            self._cache.set(key, value)
+
+        return value
+
+    def getSimilarityDouble(self, ngg1, ngg2):
+        return self._cached("double", self._metric.getSimilarityDouble, ngg1, ngg2)
+
+    def getSimilarityComponents(self, ngg1, ngg2):
+        # a copy, so that callers may change it
+        return dict(
+            self._cached("components", self._metric.getSimilarityComponents, ngg1, ngg2)
+        )
+
+    def getSimilarityFromComponents(self, Dict):
+        return self._metric.getSimilarityFromComponents(Dict)
+
+    # similarities found below the threshold are not
+    # known exactly, so only those reaching it are kept
+    def similarity_at_least(self, ngg1, ngg2, threshold):
+        key = self._key("double", ngg1, ngg2)
+        if key is None:
+            return self._metric.similarity_at_least(ngg1, ngg2, threshold)
+
+        similarity = self._cache.get(key)
+        if similarity is not None:
+            return similarity if similarity >= threshold else None
+
+        similarity = self._metric.similarity_at_least(ngg1, ngg2, threshold)
+        if similarity is not None:
+            self._cache.set(key, similarity)
+        return similarity
+
+
+# the SS-similarity of graphs of the given sizes
+def size_similarity(size1, size2):
+    y = max(size1, size2)
+    if y == 0:  # If both graphs are zero sized
+        return 0.0  # return zero
+    return (min(size1, size2) * 1.0) / y
+
+
+# the ratio of the edge counts of two ngram graphs, which
+# bounds their VS-similarity as every common edge adds at
+# most 1 to its sum
+def _edges_similarity(ngg1, ngg2):
+    ne1, ne2 = len(ngg1), len(ngg2)
+    if ne1 == ne2 == 0:
+        return 1.0
+    return (min(ne1, ne2) * 1.0) / max(ne1, ne2)
+
+
+# the VS-similarity of two ngram graphs, walking
+# the edges of the smaller against the larger one;
+# given least, the walk stops as soon as the sum can
+# no longer reach least, returning None
+def _value_similarity(ngg1, ngg2, least=None):
+    if ngg1.shares_vocabulary(ngg2):
+        return _value_similarity_of_stores(
+            ngg1.getEdgeStore(), ngg2.getEdgeStore(), least
+        )
+
+    s = 0.0
+    g1 = ngg1.getGraph()
+    g2 = ngg2.getGraph()
+    ne1 = g1.number_of_edges()
+    ne2 = g2.number_of_edges()
+
+    if ne1 == ne2 == 0:
+        return 1.0
+
+    if ne1 > ne2:
+        g1, g2 = g2, g1
+
+    if least is not None:
+        needed = _needed_sum(least, max(ne1, ne2))
+        # (undirected edges are counted from both endpoints)
+        left = sum(len(edges) for (_, edges) in g1.adjacency())
+
+    # walk the adjacency dicts themselves, visiting
+    # undirected edges from their first endpoint only
+    # (and finding them either way round in g2)
+    neighbours = dict(g2.adjacency())
+    seen = set()
+    for (u, edges) in g1.adjacency():
+        other = neighbours.get(u)
+        if other is not None:
+            for (v, d) in edges.items():
+                dp = other.get(v)
+                if dp is not None and v not in seen:
+                    w1 = d["weight"]
+                    w2 = dp["weight"]
+                    s += min(w1, w2) / max(w1, w2)
+        if not g1.is_directed():
+            seen.add(u)
+        if least is not None:
+            left -= len(edges)
+            if s + left < needed:
+                return None
+    return s / max(ne1, ne2)
+
+
+# VS-similarity of two compact graphs over the same vertex
+# ids: the edges of the smaller are looked up by their
+# packed keys, as a sorted array search if keys fit in 64 bits
+# (with least, see _value_similarity, only the key by key
+# walk of wider ids stops early)
+def _value_similarity_of_stores(store1, store2, least=None):
+    ne1 = len(store1)
+    ne2 = len(store2)
+
+    if ne1 == ne2 == 0:
+        return 1.0
+
+    if ne1 > ne2:
+        store1, store2 = store2, store1
+
+    if store1.vocabulary.id_bits > 32:
+        s = 0.0
+        if least is not None:
+            needed = _needed_sum(least, max(ne1, ne2))
+            left = ne1
+
+        weights = store2.weights
+        for (key, w1) in store1.weights.items():
+            w2 = weights.get(key)
+            if w2 is not None:
+                s += min(w1, w2) / max(w1, w2)
+            if least is not None:
+                left -= 1
+                if s + left < needed:
+                    return None
+        return s / max(ne1, ne2)
+
+    keys1, weights1 = store1.key_arrays()
+    keys2, weights2 = store2.key_arrays()
+
+    index = np.searchsorted(keys2, keys1)
+    index[index == len(keys2)] = 0
+    found = keys2[index] == keys1
+
+    weights1 = weights1[found]
+    weights2 = weights2[index[found]]
+
+    s = np.sum(np.minimum(weights1, weights2) / np.maximum(weights1, weights2))
+    return s.item() / max(ne1, ne2)
+
+
+# the sum of edge ratios a VS-similarity of least needs over
+# size edges, less a margin for rounding, so that walks stop
+# early only when the exact sum could not reach least
+def _needed_sum(least, size):
+    return least * size * (1 - 1e-9)
+
+
+# identifies a graph in a SimilarityCache by its fingerprint
+# and, as networkx graphs may hold vertices without edges,
+# its size; None for objects without a fingerprint
+def _graph_fingerprint(ngg):
+    fingerprint = getattr(ngg, "fingerprint", None)
+    if fingerprint is None:
+        return None
+
+    if ngg.is_compact():
+        return fingerprint(), None
+    return fingerprint(), ngg.number_of_edges()
+
+
+# the approximate memory taken by a cache entry
+def _entry_size(key, value):
+    size = sys.getsizeof(key) + sum(sys.getsizeof(part) for part in key[1:])
+    size += sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(sys.getsizeof(v) for v in value.values())
+    return size
@@ -1,7 +1,22 @@
+import concurrent.futures
 import copy
-import threading
+import itertools
+import os
 import warnings
 
+from pyinsect.structs import edge_algebra
+
+
+# copies the graph an operator works on (for dc): graphs
+# that clone themselves (see DocumentNGramGraph.clone) only
+# copy their edges once written to, anything else is deep
+# copied
+def _copy(graph):
+    clone = getattr(graph, "clone", None)
+    if clone is None:
+        return copy.deepcopy(graph)
+    return clone()
+
 
 # a general Operator class
 class Operator(object):
@@ -32,7 +47,7 @@ class UnaryOperator(Operator):
 class Clone(UnaryOperator):
     def apply(self, *args):
         super(self.__class__, self).apply(args)
-        return copy.deepcopy(args[0])
+        return _copy(args[0])
 
 
 # a general NaryOperator class
@@ -96,7 +111,7 @@ class Union(BinaryOperator):
                 b = g1
         # applies deepcopy only on argument a
         if dc:
-            r = copy.deepcopy(a)
+            r = _copy(a)
         else:
             r = a
 
@@ -133,37 +148,36 @@ class Intersect(BinaryOperator):
         # If graphs operation is commutative
         # replace it's appliance order
         if self._commutative:
-            if g1.size() < g2.size():
+            if len(g1) < len(g2):
                 a = g2
                 b = g1
 
         # applies deepcopy only on argument a
         if dc:
-            r = copy.deepcopy(a)
+            r = _copy(a)
         else:
             r = a
 
-        gg2 = b.getGraph()
-
-        rg = r.getGraph()
-        re = rg.edges(data=True)
+        # both compact over the same ids, merge the sorted edge keys
+        if r.combine(b, edge_algebra.intersection):
+            return r
 
         # pseudocode:
         # For graphs G1,G2 where smallGraph = min(G1,G2) & bigGraph = max(G1,G2)
         # bigGraph gets deepcopied to bigGraph'
-        # For all (A,B) belongs in smallGraph edges
-        #    if (A,B) belongs also to bigGraph edges (deep-copied graph)
+        # For all (A,B) belongs in bigGraph' edges
+        #    if (A,B) belongs also to smallGraph edges
         #       replace the weight with value ((w1+w2)/2) on bigGraph'
         #    else
-        #       remove edge from bigGraph' with the value it has on small graph
+        #       remove edge from bigGraph'
         # return bigGraph'
-        for (u, v, w) in gg2:
-            if (u, v) in re:
+        for (u, v, w) in list(r.weighted_edges()):
+            other_weight = b.getEdgeWeight(u, v)
+            if other_weight is not None:
                 # upon common reassign weights
-                ed = re.get_edge_data(u, v)
-                r.setEdge(u, v, (ed["weight"] + w["weight"]) / 2.0)
+                r.setEdge(u, v, (w + other_weight) / 2.0)
             else:
-                # delte the non common
+                # delete the non common
                 r.delEdge(u, v)
         # deletes unreached nodes (trims graph)
         r.deleteUnreachedNodes()
@@ -189,15 +203,13 @@ class delta(BinaryOperator):
         a, b = args
         # applies deepcopy only on argument a
         if dc:
-            r = copy.deepcopy(a)
+            r = _copy(a)
         else:
             r = a
 
-        gg2 = b.getGraph()
-        gg2ed = gg2.edges()
-
-        rg = r.getGraph()
-        re = rg.edges()
+        # both compact over the same ids, merge the sorted edge keys
+        if r.combine(b, edge_algebra.difference):
+            return r
 
         # pseudocode:
         # For graphs G1,G2
@@ -206,8 +218,8 @@ class delta(BinaryOperator):
         #    if (A,B) belongs also to G2 edges (deep-copied graph)
         #       delete it from G1'
         # return G1'
-        for (u, v) in re:
-            if (u, v) in gg2ed:
+        for (u, v, _) in list(r.weighted_edges()):
+            if b.getEdgeWeight(u, v) is not None:
                 r.delEdge(u, v)
         # deletes unreached nodes (trims graph)
         r.deleteUnreachedNodes()
@@ -235,15 +247,13 @@ class inverse_intersection(BinaryOperator):
 
         # applies deepcopy only on argument a
         if dc:
-            r = copy.deepcopy(a)
+            r = _copy(a)
         else:
             r = a
 
-        gg2 = b.getGraph()
-        gg2ed = gg2.edges(data=True)
-
-        rg = r.getGraph()
-        re = rg.edges()
+        # both compact over the same ids, merge the sorted edge keys
+        if r.combine(b, edge_algebra.symmetric_difference):
+            return r
 
         # pseudocode:
         # For graphs G1,G2
@@ -254,26 +264,58 @@ class inverse_intersection(BinaryOperator):
         #    else
         #       add edges to G1'
         # return G1'
-        for (u, v, w) in gg2ed:
-            if (u, v) in re:
+        for (u, v, w) in list(b.weighted_edges()):
+            if r.getEdgeWeight(u, v) is not None:
                 r.delEdge(u, v)
             else:
-                r.setEdge(u, v, w["weight"])
+                r.setEdge(u, v, w)
         r.deleteUnreachedNodes()
         return r
 
 
+# merges graphs (any iterable of them) into a copy of the first
+# as a running average: the k-th graph gets the learning factor
+# 1 / (k + 1), or weights[k] / (weights[0] + ... + weights[k])
+# given weights (see DocumentNGramGraph.merge); for edges that
+# every graph holds, the result is their (weighted) mean weight
+def merge_many(graphs, weights=None, dc=True):
+    graphs = iter(graphs)
+    weights = itertools.repeat(1) if weights is None else iter(weights)
+
+    first = next(graphs, None)
+    if first is None:
+        return None
+
+    r = _copy(first) if dc else first
+    return r.merge(graphs, weights, weight=next(weights))
+
+
+# intersects graphs (any iterable of them): keeps the edges all
+# of them hold, weighing the mean or min (by combine) of their
+# weights; starts from a copy of the graph of fewest edges and
+# probes the others from the smallest up, stopping once no edge
+# is left (see DocumentNGramGraph.intersect)
+def intersect_many(graphs, combine="mean", dc=True):
+    graphs = sorted(graphs, key=len)
+    if not graphs:
+        return None
+
+    r = _copy(graphs[0]) if dc else graphs[0]
+    return r.intersect(graphs[1:], combine)
+
+
 # implents "update", which is the correct way
 # similarity wise of applying Union on multiple
 # arguments
 class Update(NaryOperator):
     def __init__(self, *args):
         super(self.__class__, self).__init__(*args)
-        self._Op = Union()
-        # undex is used as an index for the current number of arguments
-        # that have been updated
-        self._undex = 0
 
+    # Start from left
+    # while I have more items to the right
+    # Get next item
+    # union it in, with learning factor 1 / (k + 1)
+    # for the k-th item (see merge_many)
     def apply(self, *args, **kwargs):
 
         if "dc" in kwargs:
@@ -281,67 +323,45 @@ class Update(NaryOperator):
         else:
             dc = True
 
-        nargs = len(args)
+        return merge_many(args, dc=dc)
 
-        # Start from left
-        # while I have more items to the right
-        # Get next item
-        # call UnionOp.apply.(leftItem, rightItem)
-        # apply recursively
 
-        # recursion sink: 0->problem, 1->return.
-        if nargs == 0:
-            return None
-        elif nargs == 1:
-            if dc:
-                return copy.deepcopy(args[0])
-            else:
-                res = args[0]
-                return res
-        else:
-            # Apply on the first two
-            self._undex += 1
-            # from undex-1 arguments unified this is the 1
-            # so the learning factor is assigned relatively
-            lF = self._undex / (self._undex + 1)
-            # replace the learning factor with the new one
-            self._Op.setLF(lF)
-            # apply arguments one by one
-            z = self._Op.apply(args[0], args[1], dc=dc)
-            q = list(args[2:])
-            # with the same method on the rest of the elements
-            return self.apply(*([z] + q), dc=False)
-
-
-# Implements a way parallel way for
-# applying an Nary operator
+# Implements a parallel way for applying an
+# associative ("distributional") binary operator
+# on many arguments, as a balanced tree of
+# pairs reduced in a process pool
 class ParallelNary(NaryOperator):
 
-    # initializes a parallel Nary
-    # operator for operator op
-    # and number of threads = 0
-    # parallel Nary can correctly
-    # be applied when operator
-    # is distributable
+    # initializes a parallel Nary operator for
+    # operator op, over nthreads worker processes
+    # (one per core if 0, while 1 applies it in
+    # this process); the result is only correct
+    # if the operator is distributional
     def __init__(self, op, nthreads=0):
         self._Op = op
         q = int(nthreads)
         self._nthreads = q
         if q < 0:
             raise ValueError("Nthreads must be positive!")
-        try:
-            if not op._distributable:
-                warnings.warn(
-                    "Given operator is not defined as distributable.\nResult may be false.",
-                    UserWarning,
-                )
-        except AttributeError:
+        if not getattr(op, "_distributional", False):
             warnings.warn(
-                "Given operator is not defined as distributable.\nResult may be false.",
+                "Given operator is not defined as distributional.\nResult may be false.",
                 UserWarning,
             )
 
     # applies an Nary Parallel operator
+    # Pseudo code
+    # while more than one item is left
+    # pair items (1, 2), (3, 4), ... (an odd last
+    # one waits for the next round)
+    # call op.(leftItem, rightItem) on every pair
+    #
+    # the pairs are always the same, whatever the
+    # number of processes, so floating point weights
+    # come out the same too; workers reduce aligned
+    # runs of a power of two items (several rounds
+    # at once) and compact graphs over one vocabulary
+    # are sent as their edge key arrays
     def apply(self, *args, **kwargs):
 
         # a checks for a deepcopy argument
@@ -352,95 +372,107 @@ class ParallelNary(NaryOperator):
             dc = kwargs["dc"]
         else:
             dc = True
-        nargs = len(args)
-        print(nargs)
 
-        # recursion sink
+        nargs = len(args)
         if nargs == 0:
             return None
         elif nargs == 1:
             if dc:
-                return copy.deepcopy(args[0])
+                return _copy(args[0])
             else:
                 return args[0]
+
+        template = _template_of(args)
+        if template is not None:
+            items = [arg.key_arrays() for arg in args]
+        elif dc:
+            items = [_copy(arg) for arg in args]
         else:
-            l = []
-            # arrange tuples
-            for count, thing in enumerate(args):
-                if (count % 2) == 1:
-                    l.append((prev, thing))
-                else:
-                    pass
-
-            # create a mutable object to pass to threads
-            fargs = {}
-
-            lock = threading.Lock()
-            threads = []
-            # threads on tuples of input
-
-            # positive thrads means a number
-
-            # positive threads mean's run at most n threads
-            i = 0
-            # for positive threads
-            if self._nthreads > 0:
-                for (a, b) in l:
-                    thr = threading.Thread(
-                        target=self._executor,
-                        args=(self._Op.apply, a, b, dc, fargs, str(i), lock),
-                    )
-                    threads.append(thr)
-                    i += 1
-                    # group - start - join every time we reach n threads
-                    if i % nthreads == 0:
-                        # start threads
-                        [t.start() for t in threads]
-
-                        # wait for threads to finish
-                        [t.join() for t in threads]
-                        threads = []
-
-                # if some threads have not been executed
-                # run 'em!
-                if i % nthreads != 0:
-                    [t.start() for t in threads]
-                    # wait for threads to finish
-                    [t.join() for t in threads]
-
-            # infinity threads means no boundary
-            elif self._nthreads == 0:
-                for (a, b) in l:
-                    thr = threading.Thread(
-                        target=self._single_executor,
-                        args=(self._Op.apply, a, b, dc, fargs, str(i), lock),
-                    )
-                    threads.append(thr)
-                    i += 1
-                [t.start() for t in threads]
-                # wait for threads to finish
-                [t.join() for t in threads]
-
-            # if the argument length is odd append the last param
-            # not added in touples
-            # recursive call for the rest
-            #
-            if (nargs % 2) != 0:
-                fargs[str(len(l))] = args[-1]
-                return self.apply(*(list(fargs.values())), dc=False)
-            else:
-                return self.apply(*(list(fargs.values())), dc=False)
+            items = list(args)
+
+        nthreads = self._nthreads or os.cpu_count()
+        if nthreads == 1:
+            result = _reduce_run(self._Op, items, template)
+        else:
+            with concurrent.futures.ProcessPoolExecutor(
+                nthreads, initializer=_init_worker, initargs=(template,)
+            ) as pool:
+                while len(items) > 1:
+                    # about a run per process
+                    size = 1 << max(1, (len(items) // nthreads).bit_length() - 1)
+
+                    futures = [
+                        pool.submit(_reduce_run, self._Op, items[i : i + size])
+                        for i in range(0, len(items), size)
+                    ]
+                    items = [future.result() for future in futures]
+
+            result = items[0]
+
+        if template is not None:
+            return template.set_key_arrays(*result)
+        return result
+
+
+# an empty graph like the arguments, if all of them are compact
+# over one vocabulary (of ids of up to 32 bits), from which their
+# key arrays are turned back into graphs; None otherwise
+def _template_of(args):
+    first = args[0]
+    is_compact = getattr(first, "is_compact", None)
+    if is_compact is None or not is_compact():
+        return None
+
+    store = first.getEdgeStore()
+    if store.vocabulary.id_bits > 32:
+        return None
+
+    for arg in args:
+        if (
+            not first.shares_vocabulary(arg)
+            or arg.getEdgeStore().directed != store.directed
+        ):
+            return None
+
+    return first.spawn()
 
-    # a single executor for parallel Nary
-    def _single_executor(self, f, a, b, dc, fargs, dst, lock):
-        ## calculate operators apply - given by f - on a,b
-        r = f(a, b, dc=dc)
-        ## lock
-        lock.acquire()
-        ## add to results
-        fargs[dst] = r
-        ## unlock
-        lock.release()
+
+# the template of the worker processes of a ParallelNary
+_template = None
+
+
+def _init_worker(template):
+    global _template
+    _template = template
+
+
+# reduces items (graphs, or key arrays of graphs like template)
+# pairwise in rounds, as ParallelNary.apply, down to one
+def _reduce_run(operator, items, template=None):
+    if template is None:
+        template = _template
+
+    # (graphs are rebuilt from their key arrays a pair at a time)
+    def graph(item):
+        if template is None:
+            return item
+        return template.spawn().set_key_arrays(*item)
+
+    def item(graph):
+        if template is None:
+            return graph
+        return graph.key_arrays()
+
+    while len(items) > 1:
+        reduced = [
+            item(operator.apply(graph(a), graph(b), dc=False))
+            for a, b in zip(items[::2], items[1::2])
+        ]
+        if len(items) % 2:
+            reduced.append(items[-1])
+        items = reduced
+
+    return items[0]
 
 
 # Implements an N to R Nary
@@ -468,18 +500,18 @@ class LtoRNary(NaryOperator):
             dc = True
 
         nargs = len(args)
-        # recursion sink
         if nargs == 0:
             return None
         elif nargs == 1:
             if dc:
-                return copy.deepcopy(args[0])
+                return _copy(args[0])
             else:
                 return args[0]
-        else:
-            # Apply on the first two
-            z = self._Op.apply(args[0], args[1], dc=dc)
-            q = list(args[2:])
-            # recursively apply the result to the rest
-            # now dc is false
-            return self.apply(*([z] + q), dc=False)
+
+        # Apply on the first two
+        z = self._Op.apply(args[0], args[1], dc=dc)
+        # then the result to the rest, one by one
+        # now dc is false
+        for arg in args[2:]:
+            z = self._Op.apply(z, arg, dc=False)
+        return z
@@ -1,6 +1,9 @@
 from pyinsect.documentModel.comparators.NGramGraphSimilarity import (
+    CachedSimilarity,
     Similarity,
+    SimilarityCache,
     SimilarityHPG,
+    SimilarityMultiRank,
     SimilarityNVS,
     SimilaritySS,
     SimilarityVS,
@@ -17,5 +20,8 @@ from pyinsect.documentModel.comparators.Operator import (
     Union,
     Update,
     delta,
+    intersect_many,
     inverse_intersection,
+    merge_many,
 )
+from pyinsect.documentModel.comparators.sketches import EdgeMinHash, SimilarityEstimate
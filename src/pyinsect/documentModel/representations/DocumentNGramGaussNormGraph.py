@@ -7,14 +7,16 @@
 
 import math
 
-import networkx as nx
+import numpy as np
 
 from pyinsect.documentModel.representations.DocumentNGramGraph import DocumentNGramGraph
+from pyinsect.documentModel.representations.kernels import GaussianKernel
 
 
 class DocumentNGramGaussNormGraph(DocumentNGramGraph):
     # an extension of DocumentNGramGraph
     # for symmetric windowing
+    _directed = False
     _sigma = 1
     _mean = 0
     _a = 1 / math.sqrt(2 * math.pi)
@@ -25,6 +27,12 @@ class DocumentNGramGaussNormGraph(DocumentNGramGraph):
         self.setData(d)
         self._Data
 
+        # initialize graph
+        self.clear()
+
+        if self._vectorized:
+            return self._build_vectorized(verbose)
+
         # build ngram
         ng = self.build_ngram()
         s = len(ng)
@@ -32,25 +40,17 @@ class DocumentNGramGaussNormGraph(DocumentNGramGraph):
         # calculate window
         win = (3 * self._Dwin) // 2
 
-        # calculate gaussian params
-        self.set_dsf(self._Dwin // 2, 0)
-
-        # initialize graph
-        self._Graph = nx.Graph()
-        self._edges = set()
-
         if s >= 2 and self._Dwin >= 1:
             # max possible window size (bounded by win)
             o = min(win, s) + 1
             window = ng[1:o]
             i = o
+            # weights by distance
+            weights = self._kernel_table(o - 1).tolist()
             # first build the full window
             for gram in ng[0 : s - 1]:
-                j = 1
-                for w in window:
-                    # weigh in the correct way
-                    self.addEdgeInc(gram, w, float(format(self.pdf(j), ".2f")))
-                    j += 1
+                for w, weight in zip(window, weights):
+                    self.addEdgeInc(gram, w, weight)
                 window.pop(0)
                 # if window's edge has reached
                 # it's the limit of ng stop
@@ -60,8 +60,25 @@ class DocumentNGramGaussNormGraph(DocumentNGramGraph):
                     i += 1
             if verbose:
                 self.GraphDraw(self._GPrintVerbose)
+        # (None for compact graphs, see getGraph)
         return self._Graph
 
+    # each gram is linked to the next (3 * Dwin) // 2 grams,
+    # weighted by the kernel of their distance
+    def _window_offsets(self, s):
+        win = (3 * self._Dwin) // 2
+        if s < 2 or self._Dwin < 1:
+            return None
+        o = min(win, s)
+        return np.arange(1, o + 1), self._kernel_table(o)
+
+    # weights are the pdf of a normal distribution with
+    # sigma Dwin // 2, rounded to two decimals
+    def _default_kernel(self):
+        # (keeps pdf in line with the weights)
+        self.set_dsf(self._Dwin // 2, 0)
+        return GaussianKernel(self._Dwin // 2, digits=2)
+
     # sets mean, sigma to support
     # multiple pdf function calls
     # without the need of recalculations
@@ -70,8 +87,6 @@ class DocumentNGramGaussNormGraph(DocumentNGramGraph):
         self._mean = mean
         self._a = 1.0 / (sigma * math.sqrt(2 * math.pi))
         self._b = 2.0 * (sigma ** 2)
-        print(self._a)
-        print(self._b)
 
     # calculates given a distance and a mena given inside
     # the
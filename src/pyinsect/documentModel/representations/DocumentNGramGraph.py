@@ -7,13 +7,34 @@
  *
 """
 
+import copy
+import hashlib
+import itertools
 import logging
+import math
+import mmap
+import os
+import struct
+import sys
 
 import matplotlib.pyplot as plt
 import networkx as nx
-from networkx.algorithms.isomorphism import numerical_edge_match
+import numpy as np
 from networkx.drawing.nx_agraph import graphviz_layout
 
+from pyinsect.documentModel.representations.kernels import ConstantKernel
+from pyinsect.documentModel.representations.vectorized import (
+    EdgeCounter,
+    aggregate_edges,
+    decode_range,
+    encode_symbols,
+    ngram_ids,
+    window_pairs,
+)
+from pyinsect.structs import edge_algebra
+from pyinsect.structs.edge_store import EdgeStore
+from pyinsect.structs.vocabulary import AlphabetVocabulary
+
 logger = logging.getLogger(__name__)
 
 """
@@ -25,8 +46,34 @@ logger = logging.getLogger(__name__)
 
 
 class DocumentNGramGraph:
+    # whether edges are directed, the
+    # symmetric window variants are not
+    _directed = True
+
     # initialization
-    def __init__(self, n=3, Dwin=2, Data=[], GPrintVerbose=True):
+    # with `compact` (or a shared `vocabulary`) edges are kept
+    # in an integer keyed EdgeStore and the networkx graph is
+    # only built when asked for through getGraph
+    # `vectorized` builds the graph with numpy array operations
+    # instead of the (equivalent) window scan
+    # `kernel` weighs co-occurrences by distance (see kernels)
+    # `alphabet` makes the graph compact over an AlphabetVocabulary,
+    # packing the n-grams of small alphabets (e.g. DNA) into their ids
+    # `max_edges` caps the number of edges kept to the heaviest ones
+    # (see trim and weight_error)
+    def __init__(
+        self,
+        n=3,
+        Dwin=2,
+        Data=[],
+        GPrintVerbose=True,
+        compact=False,
+        vocabulary=None,
+        vectorized=True,
+        kernel=None,
+        alphabet=None,
+        max_edges=None,
+    ):
         # consider not having characters but lists of objects
         self._Data = []
 
@@ -36,15 +83,19 @@ class DocumentNGramGraph:
         # stores the ngram
         self._ngram = []
 
-        # store the ngram graph
-        self._Graph = nx.DiGraph()
+        # compact edge store (optional)
+        self._store = None
+        if vocabulary is None and alphabet is not None:
+            vocabulary = AlphabetVocabulary(alphabet)
+        if compact or vocabulary is not None:
+            self._store = EdgeStore(vocabulary, directed=self._directed)
 
-        # cache of edges (set vs. list)
-        self._edges = set()
+        # store the ngram graph
+        self.clear()
 
-        # the graph stores it's maximum and minimum weigh
-        self._maxW = 0
-        self._minW = float("inf")
+        self._vectorized = vectorized
+        self._kernel = kernel
+        self._max_edges = max_edges
 
         # data must be "listable"
         self._Dwin = abs(int(Dwin))
@@ -58,12 +109,16 @@ class DocumentNGramGraph:
             self.buildGraph()
 
     def __len__(self):
+        if self._store is not None:
+            return len(self._store)
         return self._Graph.size()
 
+    # ngrams label the vertices, so equal graphs are those with
+    # the same labelled edges (see equals)
     def __eq__(self, other):
-        return nx.is_isomorphic(
-            self._Graph, other._Graph, edge_match=numerical_edge_match("weight", 1)
-        )
+        if not isinstance(other, DocumentNGramGraph):
+            return NotImplemented
+        return self.equals(other)
 
     # we will now define @method buildGraph
     # which takes a data input
@@ -76,6 +131,9 @@ class DocumentNGramGraph:
         self.setData(d)
         self._Data
 
+        if self._vectorized:
+            return self._build_vectorized(verbose)
+
         # build ngram
         ng = self.build_ngram()
         s = len(ng)
@@ -87,27 +145,266 @@ class DocumentNGramGraph:
 
         o = min(self._Dwin, s)
         if o >= 1:
+            # weights by distance, farthest first
+            weights = self._kernel_table(o + 1).tolist()[::-1]
+
             window = [ng[0]]
             # append the first full window
             # while adding the needed edges
             for gram in ng[1 : o + 1]:
-                for w in window:
-                    self.addEdgeInc(gram, w)
+                for w, weight in zip(window, weights[-len(window) :]):
+                    self.addEdgeInc(gram, w, weight)
                 window.append(gram)
 
             # with full window span till
             # the end.
             for gram in ng[o + 1 :]:
-                for w in window:
-                    self.addEdgeInc(gram, w)
+                for w, weight in zip(window, weights):
+                    self.addEdgeInc(gram, w, weight)
                 window.pop(0)
                 window.append(gram)
 
             # print graph (optional)
             if verbose:
                 self.GraphDraw(self._GPrintVerbose)
+        # (None for compact graphs, see getGraph)
         return self._Graph
 
+    # the neighbours each of s ngrams is linked to, as
+    # the (offsets, weights) visited by the window scan of
+    # buildGraph, or None when no edges are created
+    def _window_offsets(self, s):
+        o = min(self._Dwin, s)
+        if o < 1:
+            return None
+        # the window holds the o + 1 preceding grams, oldest first
+        return np.arange(-(o + 1), 0), self._kernel_table(o + 1)[::-1]
+
+    # the weights of distances 1 to window, as given by
+    # the kernel of the graph
+    def _kernel_table(self, window):
+        kernel = self._kernel
+        if kernel is None:
+            kernel = self._default_kernel()
+        return kernel.table(window)
+
+    # the weighting of graphs built without a kernel
+    def _default_kernel(self):
+        return ConstantKernel()
+
+    # numpy counterpart of the window scans of buildGraph:
+    # ngrams become integer ids, all (gram, neighbour) pairs
+    # are generated as arrays and their weights summed at once
+    def _build_vectorized(self, verbose=False):
+        edges = self._edge_arrays()
+
+        # ngrams are rebuilt by getngram if needed
+        self._ngram = None
+
+        if edges is not None:
+            self._add_edges(*edges)
+
+            # print graph (optional)
+            if verbose:
+                self.GraphDraw(self._GPrintVerbose)
+        # (None for compact graphs, see getGraph)
+        return self._Graph
+
+    # builds the graph of a document given as consecutive chunks
+    # (strings, bytes or integer arrays) without keeping the
+    # whole of it: the result is the graph buildGraph builds
+    # on their concatenation, but the data is not stored
+    def build_from_chunks(self, chunks, verbose=False):
+        self.setData([])
+        self.clear()
+        self._ngram = None
+
+        # offsets reaching beyond the data pair nothing, so
+        # the widest window serves any document length
+        window = self._window_offsets(sys.maxsize)
+        if window is None:
+            return self._Graph
+
+        # with max_edges, at most twice as many edges are kept
+        counter = EdgeCounter(
+            self._n, *window, directed=self._directed, max_edges=self._max_edges
+        )
+        for chunk in chunks:
+            counter.update(chunk)
+
+        self._add_edges(*counter.finish())
+        self._weight_error += counter.error
+
+        # print graph (optional)
+        if verbose:
+            self.GraphDraw(self._GPrintVerbose)
+        # (None for compact graphs, see getGraph)
+        return self._Graph
+
+    # builds the graph of a file through a memory map instead
+    # of reading it in: mode "bytes" takes the bytes of the file
+    # as symbols and mode "text" its characters in `encoding`;
+    # given a byte range, only the ngrams starting in it are
+    # linked to their neighbours (wherever these lie), so the
+    # graphs of the ranges of a partition of the file add up
+    # (see accumulate) to the graph of the whole file
+    @classmethod
+    def from_file(
+        cls,
+        path,
+        n=3,
+        Dwin=2,
+        mode="bytes",
+        encoding="utf-8",
+        start=0,
+        stop=None,
+        **kwargs
+    ):
+        if mode not in ("bytes", "text"):
+            raise ValueError("Unknown file mode {0!r}".format(mode))
+
+        graph = cls(n, Dwin, **kwargs)
+
+        with open(path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            stop = size if stop is None else min(stop, size)
+
+            # (empty files cannot be mapped)
+            if start >= stop:
+                return graph
+
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                edges = graph._file_edge_arrays(buffer, mode, encoding, start, stop)
+
+        if edges is not None:
+            graph._add_edges(*edges)
+
+        return graph
+
+    # the edges of the ngrams starting in bytes start to stop
+    # of a mapped file; no view of the map may outlive the call
+    def _file_edge_arrays(self, buffer, mode, encoding, start, stop):
+        window = self._window_offsets(sys.maxsize)
+        if window is None:
+            return None
+
+        # symbols needed before and after the range
+        before = max(-int(window[0].min()), 0)
+        after = max(int(window[0].max()), 0) + self._n - 1
+
+        data = np.frombuffer(buffer, np.uint8)
+
+        if mode == "bytes":
+            first = max(start - before, 0)
+            symbols = data[first : stop + after], int
+            start, stop = start - first, stop - first
+        else:
+            text, start, stop = decode_range(data, encoding, start, stop, before, after)
+            symbols = encode_symbols(text)
+
+        return self._edge_arrays(symbols, start, stop)
+
+    # the aggregated edges of the data (or of the given encoded
+    # symbols), as the arguments of _add_edges, or None when no
+    # edges are created; only the ngrams at positions start to
+    # stop are linked to their neighbours; with increments, the
+    # edge and weight of every pair follow, in the order summed
+    def _edge_arrays(self, symbols=None, start=0, stop=None, increments=False):
+        codes, decode = encode_symbols(self._Data) if symbols is None else symbols
+        ids, vertices = self._ngram_vertices(codes, decode)
+
+        window = self._window_offsets(max(len(ids), 1))
+        if window is None:
+            return None
+
+        stop = len(ids) if stop is None else min(stop, len(ids))
+        sources, targets, weights = window_pairs(ids, *window, start, max(start, stop))
+        edges = aggregate_edges(
+            sources, targets, weights, len(vertices), self._directed, increments
+        )
+        if increments:
+            edges += (weights,)
+        return (vertices,) + edges
+
+    # gives every ngram position of the encoded data a dense id;
+    # returns the ids and, per id, the ngram label or, for
+    # vocabularies hashing ngrams straight from the codes
+    # (see RollingHashVocabulary), its vertex id
+    def _ngram_vertices(self, codes, decode):
+        if self._store is not None:
+            vocabulary = self._store.vocabulary
+            if hasattr(vocabulary, "intern_windows"):
+                return vocabulary.intern_windows(codes, decode, self._n)
+
+        ids, grams = ngram_ids(codes, self._n)
+        return ids, [tuple(map(decode, gram)) for gram in grams.tolist()]
+
+    # adds the aggregated edges vertices[sources] -> vertices[targets],
+    # in the given order; firsts holds the first increment of
+    # each edge (its minimum weight for positive increments)
+    def _add_edges(self, vertices, sources, targets, totals, firsts):
+        if len(totals) == 0:
+            return
+
+        self._fingerprint = None
+
+        if len(self) > 0:
+            # weights add up to the existing ones
+            if isinstance(vertices, np.ndarray):
+                # already vertex ids of the compact store
+                for u, v, w in zip(
+                    vertices[sources].tolist(),
+                    vertices[targets].tolist(),
+                    totals.tolist(),
+                ):
+                    r = self._store.get(u, v)
+                    self._set_edge_ids(u, v, w if r is None else r + w)
+            else:
+                for u, v, w in zip(sources.tolist(), targets.tolist(), totals.tolist()):
+                    self.addEdgeInc(vertices[u], vertices[v], w)
+
+            # (the heaviest of all edges, with max_edges)
+            self.trim()
+            return
+
+        if self._max_edges is not None and len(totals) > self._max_edges:
+            # keep the heaviest edges, in their order of appearance
+            order = np.argsort(-totals, kind="stable")
+            self._weight_error += totals[order[self._max_edges]].item()
+
+            keep = np.sort(order[: self._max_edges])
+            sources, targets = sources[keep], targets[keep]
+            totals, firsts = totals[keep], firsts[keep]
+
+        self._own()
+
+        if isinstance(vertices, np.ndarray):
+            # already vertex ids of the compact store
+            self._store.set_many(vertices[sources], vertices[targets], totals.tolist())
+            self._Graph = None
+        elif self._store is not None:
+            # intern in order of first appearance, as addEdgeInc would
+            endpoints = np.column_stack((sources, targets)).ravel()
+            _, first = np.unique(endpoints, return_index=True)
+
+            vocabulary = self._store.vocabulary
+            ids = np.zeros(
+                len(vertices), np.uint64 if vocabulary.id_bits > 32 else np.int64
+            )
+            for label in endpoints[np.sort(first)].tolist():
+                ids[label] = vocabulary.intern(vertices[label])
+
+            self._store.set_many(ids[sources], ids[targets], totals.tolist())
+            self._Graph = None
+        else:
+            self._Graph.add_edges_from(
+                (vertices[u], vertices[v], {"key": "edge", "weight": w})
+                for u, v, w in zip(sources.tolist(), targets.tolist(), totals.tolist())
+            )
+
+        self._maxW = max(self._maxW, totals.max().item())
+        self._minW = min(self._minW, firsts.min().item())
+
     # add's an edge if it's non existent
     # if it is increments it's weight
     # !notice: reiweighting technique may be false
@@ -119,8 +416,19 @@ class DocumentNGramGraph:
         # add an extra class variable
         A = tuple(a)
         B = tuple(b)
-        if (A, B) in self._edges:
-            edata = self._Graph.get_edge_data(A, B)
+        if self._store is not None:
+            # compact store: intern once, work on ids
+            vocabulary = self._store.vocabulary
+            u = vocabulary.intern(A)
+            v = vocabulary.intern(B)
+            r = self._store.get(u, v)
+            self._set_edge_ids(u, v, w if r is None else r + w)
+            return
+
+        # lookups go through the graph itself, so that
+        # undirected graphs find (B, A) when given (A, B)
+        edata = self._Graph.get_edge_data(A, B)
+        if edata is not None:
             # DEBUG LINES
             # print "updating edge between (",A,B,")"
             # print "to weight",(edata['weight']+1)
@@ -151,28 +459,27 @@ class DocumentNGramGraph:
 
     # draws a graph using math plot lib
     def GraphDraw(self, verbose=True, print_name="graph", lf=True, ns=1000, wf=True):
-        pos = graphviz_layout(self._Graph)
-        # pos = sring_layout(self._Graph, scale=1)
-        # nx.draw(self._Graph,pos = pos,node_size=ns,with_labels = lf, node_color = 'm')
+        graph = self.getGraph()
+        pos = graphviz_layout(graph)
+        # pos = sring_layout(graph, scale=1)
+        # nx.draw(graph,pos = pos,node_size=ns,with_labels = lf, node_color = 'm')
         nx.draw(
-            self._Graph,
-            pos=graphviz_layout(self._Graph, prog="dot"),
+            graph,
+            pos=graphviz_layout(graph, prog="dot"),
             node_size=ns,
             cmap=plt.cm.Blues,
-            node_color=list(range(len(self._Graph))),
+            node_color=list(range(len(graph))),
             with_labels=lf,
         )
         if wf:
-            weight_labels = nx.get_edge_attributes(self._Graph, "weight")
-            nx.draw_networkx_edge_labels(
-                self._Graph, pos=pos, edge_labels=weight_labels
-            )
+            weight_labels = nx.get_edge_attributes(graph, "weight")
+            nx.draw_networkx_edge_labels(graph, pos=pos, edge_labels=weight_labels)
         if verbose:
             plt.show()
         else:
             # plt.savefig('g.png')
             # or to dot
-            nx.drawing.nx_pydot.write_dot(self._Graph, print_name + ".dot")
+            nx.drawing.nx_pydot.write_dot(graph, print_name + ".dot")
             # !!Uknown error: the produced dot file is
             # not readable by dot/xdot.
 
@@ -185,20 +492,107 @@ class DocumentNGramGraph:
 
     # sets an edges weight
     def setEdge(self, a, b, w=1):
-        self._edges.add((a, b))  # Update cache
+        if self._store is not None:
+            vocabulary = self._store.vocabulary
+            self._set_edge_ids(vocabulary.intern(a), vocabulary.intern(b), w)
+            return
+
+        if self._fingerprint is not None:
+            edata = self._Graph.get_edge_data(a, b)
+            self._update_fingerprint(a, b, edata and edata["weight"], w)
+
+        self._own()
         self._Graph.add_edge(a, b, key="edge", weight=w)
 
         self._maxW = max(self._maxW, w)
         self._minW = min(self._minW, w)
 
+    # sets an edges weight given the vertex ids
+    # of a compact graph
+    def _set_edge_ids(self, u, v, w):
+        if self._fingerprint is not None:
+            ngram = self._store.vocabulary.ngram
+            self._update_fingerprint(ngram(u), ngram(v), self._store.get(u, v), w)
+
+        self._own()
+        self._store.set(u, v, w)
+        # drop the networkx view, it is rebuilt on demand
+        self._Graph = None
+
+        self._maxW = max(self._maxW, w)
+        self._minW = min(self._minW, w)
+
     # deletes
     def delEdge(self, u, v):
-        self._edges.remove((u, v))
+        if self._fingerprint is not None:
+            self._update_fingerprint(u, v, self.getEdgeWeight(u, v), None)
+
+        self._own()
+        if self._store is not None:
+            vocabulary = self._store.vocabulary
+            self._store.remove(vocabulary.index(u), vocabulary.index(v))
+            self._Graph = None
+            return
+
         self._Graph.remove_edge(u, v)
 
     # trims the graph by removing unreached nodes
+    # (a compact graph has no vertices without edges)
     def deleteUnreachedNodes(self):
-        self._Graph.remove_nodes_from(list(nx.isolates(self._Graph)))
+        if self._store is not None:
+            return
+        isolates = list(nx.isolates(self._Graph))
+        if isolates:
+            self._own()
+            self._Graph.remove_nodes_from(isolates)
+
+    # empties the graph, keeping n, Dwin and the data
+    def clear(self):
+        if self._store is not None:
+            # (a new store, the old one may be shared by clones)
+            self._store = EdgeStore(self._store.vocabulary, directed=self._directed)
+            self._Graph = None
+        elif self._directed:
+            self._Graph = nx.DiGraph()
+        else:
+            self._Graph = nx.Graph()
+
+        # the graph stores it's maximum and minimum weigh
+        self._maxW = 0
+        self._minW = float("inf")
+
+        # computed on demand, see fingerprint
+        self._fingerprint = None
+
+        # bounds the weight lost to max_edges, see weight_error
+        self._weight_error = 0
+
+        # whether the edges are shared with clones, see clone
+        self._shared = False
+
+    # a copy of the graph sharing its edges (and data) with it
+    # until either of them is written to, which first takes a
+    # copy of the edges of its own: the integer keyed weights of
+    # a compact graph, or the networkx graph (which, like the
+    # ngrams and data, must not be changed but through the
+    # methods of the graph)
+    def clone(self):
+        other = copy.copy(self)
+        self._shared = other._shared = True
+        return other
+
+    # copies the edges of a graph shared with clones, before
+    # it writes to them
+    def _own(self):
+        if not self._shared:
+            return
+
+        if self._store is not None:
+            self._store = self._store.copy()
+        else:
+            self._Graph = self._Graph.copy()
+
+        self._shared = False
 
     def setN(self, n):
         self._n = n
@@ -211,18 +605,84 @@ class DocumentNGramGraph:
         return self._MinSize
 
     def getngram(self):
+        if self._ngram is None:
+            self.build_ngram()
         return self._ngram
 
+    # returns the networkx graph, building it
+    # first if the graph is compact
     def getGraph(self):
+        if self._Graph is None:
+            self._Graph = self._store.to_networkx()
         return self._Graph
 
+    def is_compact(self):
+        return self._store is not None
+
+    def getEdgeStore(self):
+        return self._store
+
+    # returns the weight of edge (a, b) or default
+    # if there is no such edge
+    def getEdgeWeight(self, a, b, default=None):
+        if self._store is not None:
+            vocabulary = self._store.vocabulary
+            u = vocabulary.get(a)
+            v = vocabulary.get(b)
+            if u is None or v is None:
+                return default
+            return self._store.get(u, v, default)
+
+        edata = self._Graph.get_edge_data(a, b)
+        if edata is None:
+            return default
+        return edata["weight"]
+
+    # iterates over the (a, b, weight) edges
+    def weighted_edges(self):
+        if self._store is not None:
+            return self._store.edges()
+        return self._Graph.edges(data="weight")
+
     def maxW(self):
         return self._maxW
 
+    # keeps the max_edges (by default, those of the graph) heaviest
+    # edges, ties going to the edges added first, and adds the weight
+    # of the heaviest edge dropped to weight_error
+    def trim(self, max_edges=None):
+        if max_edges is None:
+            max_edges = self._max_edges
+        if max_edges is None or len(self) <= max_edges:
+            return self
+
+        edges = list(self.weighted_edges())
+        weights = np.array([w for _, _, w in edges])
+
+        order = np.argsort(-weights, kind="stable")
+        self._weight_error += weights[order[max_edges]].item()
+
+        for index in order[max_edges:].tolist():
+            a, b, _ = edges[index]
+            self.delEdge(a, b)
+
+        # a compact graph has no vertices without edges
+        self.deleteUnreachedNodes()
+        return self
+
+    # a bound on the weight lost to max_edges (or trim): every edge
+    # weighs at least its weight in the graph (0 if it was dropped)
+    # and at most that plus weight_error; for a graph built in one
+    # pass over N total weight it is at most N / (max_edges + 1)
+    def weight_error(self):
+        return self._weight_error
+
     def minW(self):
         return self._minW
 
     def number_of_edges(self):
+        if self._store is not None:
+            return self._store.number_of_nodes()
         return self._Graph.number_of_nodes()
 
     def union(self, other, learning_factor=0.5):
@@ -240,18 +700,30 @@ class DocumentNGramGraph:
             return `bigGraph`
         """
 
-        other_graph = other.getGraph()
+        if self.combine(other, edge_algebra.union, learning_factor):
+            return self
+
+        if self.shares_vocabulary(other):
+            # both compact over the same (wide) ids, skip the n-grams
+            store = self._store
 
-        # Convert edge-list to set to speed-up look-up
-        edge_set = set(self._Graph.edges())
+            for (u, v, edge_weight) in list(other._store.items()):
+                current_edge_weight = store.get(u, v)
 
-        for (vertex_start, vertex_end, edge_data) in other_graph.edges(data=True):
-            edge_weight = edge_data["weight"]
+                if current_edge_weight is not None:
+                    edge_weight = (
+                        learning_factor * edge_weight
+                        + (1 - learning_factor) * current_edge_weight
+                    )
 
-            if (vertex_start, vertex_end) in edge_set:
-                current_edge_data = self._Graph.get_edge_data(vertex_start, vertex_end)
-                current_edge_weight = current_edge_data["weight"]
+                self._set_edge_ids(u, v, edge_weight)
 
+            return self
+
+        for (vertex_start, vertex_end, edge_weight) in list(other.weighted_edges()):
+            current_edge_weight = self.getEdgeWeight(vertex_start, vertex_end)
+
+            if current_edge_weight is not None:
                 edge_weight = (
                     learning_factor * edge_weight
                     + (1 - learning_factor) * current_edge_weight
@@ -261,6 +733,318 @@ class DocumentNGramGraph:
 
         return self
 
+    # adds the weights of the edges of other to ours, as if
+    # both graphs had been built over a single document
+    def accumulate(self, other):
+        if self.shares_vocabulary(other):
+            store = self._store
+
+            for (u, v, edge_weight) in list(other._store.items()):
+                current_edge_weight = store.get(u, v)
+
+                if current_edge_weight is not None:
+                    edge_weight += current_edge_weight
+
+                self._set_edge_ids(u, v, edge_weight)
+        else:
+            for (vertex_start, vertex_end, edge_weight) in list(other.weighted_edges()):
+                self.addEdgeInc(vertex_start, vertex_end, edge_weight)
+
+        # the smallest first increment of either graph
+        self._minW = min(self._minW, other._minW)
+
+        # either graph may miss weight
+        self._weight_error += other._weight_error
+
+        return self.trim()
+
+    # merges graphs into ours as a running average: each one is
+    # union-ed in with the learning factor weight / (total +
+    # weight), total being that of ours (weight) and the graphs
+    # merged before it, so with the default weights of 1 the
+    # k-th graph counts for 1 / (k + 1) of the common edges.
+    # Every edge is visited once, summing into a single dict
+    # of weights, so it takes time linear in the edges of the
+    # graphs however many they are
+    def merge(self, graphs, weights=None, weight=1):
+        if weights is None:
+            weights = itertools.repeat(1)
+
+        if self._store is not None:
+            store = self._store
+            vocabulary = store.vocabulary
+            merged = dict(store.weights)
+        else:
+            merged = {(a, b): w for a, b, w in self._Graph.edges(data="weight")}
+
+        maxW, minW = self._maxW, self._minW
+        total = weight
+
+        for graph, weight in zip(graphs, weights):
+            # (the learning factor of the edges merged so far)
+            share = total / (total + weight)
+            total += weight
+
+            if self.shares_vocabulary(graph) and self._directed == graph._directed:
+                edges = graph._store.weights.items()
+            elif self._store is not None:
+                edges = (
+                    (store.key(vocabulary.intern(a), vocabulary.intern(b)), w)
+                    for a, b, w in graph.weighted_edges()
+                )
+            elif self._directed:
+                edges = (((a, b), w) for a, b, w in graph.weighted_edges())
+            else:
+                edges = (
+                    ((b, a) if (b, a) in merged else (a, b), w)
+                    for a, b, w in graph.weighted_edges()
+                )
+
+            for key, w in edges:
+                current = merged.get(key)
+                if current is not None:
+                    w = share * current + (1 - share) * w
+                merged[key] = w
+
+                if w > maxW:
+                    maxW = w
+                if w < minW:
+                    minW = w
+
+        if self._store is not None:
+            # (a new store, the old one may be shared by clones)
+            self._store = EdgeStore(vocabulary, directed=self._directed)
+            self._store.set_weights(merged)
+            self._shared = False
+            self._Graph = None
+        else:
+            self._own()
+            self._Graph.add_edges_from(
+                (a, b, {"key": "edge", "weight": w}) for (a, b), w in merged.items()
+            )
+
+        self._maxW, self._minW = maxW, minW
+        self._fingerprint = None
+
+        return self
+
+    # keeps the edges that every one of graphs holds too,
+    # weighing the mean (or the min, by combine) of their
+    # weights in all of them and ours; the graphs are probed in
+    # turn for the edges left so far, and not at all once none
+    # is left, so it takes about the edges of ours times the
+    # number of graphs (see intersect_many, which starts from
+    # the graph of fewest edges)
+    def intersect(self, graphs, combine="mean"):
+        if combine not in ("mean", "min"):
+            raise ValueError("Unknown weight combination {0!r}".format(combine))
+        minimum = combine == "min"
+
+        if self._store is not None:
+            store = self._store
+            common = dict(store.weights)
+        else:
+            common = {(a, b): w for a, b, w in self._Graph.edges(data="weight")}
+
+        count = 1
+        for graph in graphs:
+            if not common:
+                break
+            count += 1
+
+            if self.shares_vocabulary(graph) and self._directed == graph._directed:
+                get = graph._store.weights.get
+            elif self._store is not None:
+                get = _label_getter(store, graph)
+            else:
+                get = _pair_getter(graph)
+
+            probed = {}
+            for key, w in common.items():
+                other = get(key)
+                if other is not None:
+                    probed[key] = min(w, other) if minimum else w + other
+            common = probed
+
+        if not minimum:
+            common = {key: w / count for key, w in common.items()}
+
+        if self._store is not None:
+            # (a new store, the old one may be shared by clones)
+            self._store = EdgeStore(store.vocabulary, directed=self._directed)
+            self._store.set_weights(common)
+            self._Graph = None
+        else:
+            self._Graph = nx.DiGraph() if self._directed else nx.Graph()
+            self._Graph.add_edges_from(
+                (a, b, {"key": "edge", "weight": w}) for (a, b), w in common.items()
+            )
+
+        self._shared = False
+        self._fingerprint = None
+
+        if common:
+            self._maxW = max(self._maxW, max(common.values()))
+            self._minW = min(self._minW, min(common.values()))
+
+        return self
+
+    # an order independent 64 bit hash of the labelled, weighted
+    # edges: the sum of the hashes of all edges, so it is kept
+    # up to date by setEdge and delEdge once computed
+    def fingerprint(self):
+        if self._fingerprint is None:
+            hashes = {}
+            self._fingerprint = (
+                sum(
+                    self._edge_hash(a, b, w, hashes)
+                    for a, b, w in self.weighted_edges()
+                )
+                & _MASK
+            )
+        return self._fingerprint
+
+    # replaces the hash of an edge of weight old (None for a
+    # missing edge) with that of weight new in the fingerprint
+    def _update_fingerprint(self, a, b, old, new):
+        h = self._fingerprint
+        if old is not None:
+            h -= self._edge_hash(a, b, old)
+        if new is not None:
+            h += self._edge_hash(a, b, new)
+        self._fingerprint = h & _MASK
+
+    # hashes an edge by its labels (with their hashes cached in
+    # hashes, if given), regardless of orientation if undirected
+    def _edge_hash(self, a, b, w, hashes=None):
+        if hashes is None:
+            ha, hb = label_hash(a), label_hash(b)
+        else:
+            ha = hashes.get(a)
+            if ha is None:
+                ha = hashes[a] = label_hash(a)
+            hb = hashes.get(b)
+            if hb is None:
+                hb = hashes[b] = label_hash(b)
+
+        if not self._directed and hb < ha:
+            ha, hb = hb, ha
+
+        digest = hashlib.blake2b(struct.pack("<QQd", ha, hb, w), digest_size=8)
+        return int.from_bytes(digest.digest(), "little")
+
+    # whether both graphs hold the same labelled edges, with
+    # weights equal up to the tolerances of numerical_edge_match
+    def equals(self, other, rtol=1e-05, atol=1e-08):
+        if len(self) != len(other):
+            return False
+
+        if self.shares_vocabulary(other):
+            get = other._store.get
+            weights = ((w, get(u, v)) for u, v, w in self._store.items())
+        else:
+            get = other.getEdgeWeight
+            weights = ((w, get(a, b)) for a, b, w in self.weighted_edges())
+
+        return all(
+            r is not None and math.isclose(w, r, rel_tol=rtol, abs_tol=atol)
+            for w, r in weights
+        )
+
+    # whether both graphs are compact over compatible vertex ids
+    def shares_vocabulary(self, other):
+        return (
+            self._store is not None
+            and other._store is not None
+            and self._store.vocabulary.compatible_with(other._store.vocabulary)
+        )
+
+    # replaces our edges with those of operation (one of
+    # edge_algebra) over the sorted edge keys and weights of
+    # both graphs, given they are compact over the same ids
+    # of up to 32 bits; returns whether it did, so that
+    # callers fall back to going edge by edge
+    def combine(self, other, operation, *args):
+        if (
+            not self.shares_vocabulary(other)
+            or self._store.vocabulary.id_bits > 32
+            or self._directed != other._directed
+        ):
+            return False
+
+        keys, weights, written = operation(
+            *self._store.key_arrays(), *other._store.key_arrays(), *args
+        )
+
+        maxW, minW = self._maxW, self._minW
+        if len(written):
+            maxW = max(maxW, written.max().item())
+            minW = min(minW, written.min().item())
+
+        self.set_key_arrays(keys, weights, maxW, minW)
+        return True
+
+    # the sorted packed edge keys and weights of a compact
+    # graph (see EdgeStore.key_arrays) and its weight bounds,
+    # from which set_key_arrays restores it, e.g. to send
+    # graphs over a vocabulary between processes that have it
+    def key_arrays(self):
+        keys, weights = self._store.key_arrays()
+        return keys, weights, self._maxW, self._minW
+
+    # replaces the edges of a compact graph with those of the
+    # sorted packed keys given, which it takes over
+    def set_key_arrays(self, keys, weights, maxW, minW):
+        # (a new store, the old one may be shared by clones)
+        store = EdgeStore(self._store.vocabulary, directed=self._directed)
+        store.set_key_arrays(keys, weights)
+
+        self._store = store
+        self._shared = False
+        self._Graph = None
+        self._fingerprint = None
+
+        self._maxW, self._minW = maxW, minW
+        return self
+
+    # an empty graph of the same type and settings (n, Dwin,
+    # kernel, ...), over the same vocabulary if compact
+    def spawn(self):
+        other = copy.copy(self)
+        other._Data = []
+        other._dSize = 0
+        other._ngram = []
+        other.clear()
+        return other
+
+
+# the weight in graph of the edge of a packed key of store, or None
+def _label_getter(store, graph):
+    ngram = store.vocabulary.ngram
+
+    def get(key):
+        u, v = store.split(key)
+        return graph.getEdgeWeight(ngram(u), ngram(v))
+
+    return get
+
+
+# the weight in graph of an (a, b) edge, or None
+def _pair_getter(graph):
+    def get(key):
+        return graph.getEdgeWeight(*key)
+
+    return get
+
+
+_MASK = (1 << 64) - 1
+
+
+# a process independent hash of an ngram
+def label_hash(label):
+    digest = hashlib.blake2b(repr(label).encode("utf-8"), digest_size=8)
+    return int.from_bytes(digest.digest(), "little")
+
 
 # test script
 
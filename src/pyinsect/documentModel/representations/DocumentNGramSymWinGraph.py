@@ -5,7 +5,7 @@
 
 """
 
-import networkx as nx
+import numpy as np
 
 from pyinsect.documentModel.representations.DocumentNGramGraph import DocumentNGramGraph
 
@@ -13,6 +13,7 @@ from pyinsect.documentModel.representations.DocumentNGramGraph import DocumentNG
 class DocumentNGramSymWinGraph(DocumentNGramGraph):
     # an extension of DocumentNGramGraph
     # for symmetric windowing
+    _directed = False
 
     def buildGraph(self, verbose=False, d=[]):
 
@@ -20,6 +21,12 @@ class DocumentNGramSymWinGraph(DocumentNGramGraph):
         self.setData(d)
         self._Data
 
+        # initialize graph
+        self.clear()
+
+        if self._vectorized:
+            return self._build_vectorized(verbose)
+
         # build ngram
         ng = self.build_ngram()
         s = len(ng)
@@ -27,19 +34,17 @@ class DocumentNGramSymWinGraph(DocumentNGramGraph):
         # calculate window
         win = self._Dwin // 2
 
-        # initialize graph
-        self._Graph = nx.Graph()
-        self._edges = set()
-
         if s >= 2 and win >= 1:
             # max possible window size (bounded by win)
             o = min(win, s) + 1
             window = ng[1:o]
             i = o
+            # weights by distance
+            weights = self._kernel_table(o - 1).tolist()
             # first build the full window
             for gram in ng[0 : s - 1]:
-                for w in window:
-                    self.addEdgeInc(gram, w)
+                for w, weight in zip(window, weights):
+                    self.addEdgeInc(gram, w, weight)
                 window.pop(0)
                 # if window's edge has reached
                 # it's the limit of ng stop
@@ -50,4 +55,13 @@ class DocumentNGramSymWinGraph(DocumentNGramGraph):
             # print Graph (optional)
             if verbose:
                 self.GraphDraw(self._GPrintVerbose)
+        # (None for compact graphs, see getGraph)
         return self._Graph
+
+    # each gram is linked to the next Dwin // 2 grams
+    def _window_offsets(self, s):
+        win = self._Dwin // 2
+        if s < 2 or win < 1:
+            return None
+        o = min(win, s)
+        return np.arange(1, o + 1), self._kernel_table(o)
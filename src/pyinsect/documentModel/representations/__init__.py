@@ -1,6 +1,16 @@
+from pyinsect.documentModel.representations.batch import build_graph, build_graphs
 from pyinsect.documentModel.representations.DocumentNGramGaussNormGraph import (
     DocumentNGramGaussNormGraph,
 )
 from pyinsect.documentModel.representations.DocumentNGramSymWinGraph import (
     DocumentNGramSymWinGraph,
 )
+from pyinsect.documentModel.representations.kernels import (
+    ConstantKernel,
+    FunctionKernel,
+    GaussianKernel,
+    InverseKernel,
+    Kernel,
+    LinearKernel,
+)
+from pyinsect.documentModel.representations.multi_rank import MultiRankNGramGraph
@@ -0,0 +1,312 @@
+"""
+  batch.py
+
+  Builds the n-gram graphs of a corpus in a process pool.
+
+  Workers only run the vectorized window counting and send back the
+  aggregated edge arrays of every document, which are far cheaper to pickle
+  than graphs; the graphs themselves are assembled in the calling process
+  over one vocabulary shared by the whole corpus.
+
+  A single long document is built the same way by splitting it into
+  overlapping segments (see build_graph).
+
+"""
+
+import collections
+import concurrent.futures
+import itertools
+import logging
+import os
+
+import numpy as np
+
+from pyinsect.documentModel.representations.DocumentNGramGraph import DocumentNGramGraph
+from pyinsect.documentModel.representations.vectorized import encode_symbols
+from pyinsect.structs.vocabulary import Vocabulary
+
+logger = logging.getLogger(__name__)
+
+
+def build_graphs(
+    documents,
+    n=3,
+    Dwin=2,
+    graph_class=DocumentNGramGraph,
+    workers=None,
+    pool=None,
+    vocabulary=None,
+    chunksize=1,
+    max_pending=None,
+    **kwargs
+):
+    """Yields the compact graph of every document, in input order.
+
+    `documents` may be any (lazy) iterable; at most `max_pending` chunks of
+    `chunksize` documents are in flight at any time (twice the number of
+    workers by default).  The graphs are built in `pool` if one is given,
+    or else in a pool of `workers` processes (all cores by default), while
+    ``workers=0`` builds them in this process.
+
+    All graphs share `vocabulary` (a new `Vocabulary` by default), so their
+    similarities and operators take the integer id fast paths.  Any extra
+    keyword arguments are passed to `graph_class`.
+    """
+
+    if vocabulary is None:
+        vocabulary = Vocabulary()
+
+    if pool is None and workers == 0:
+        for document in documents:
+            yield graph_class(n, Dwin, document, vocabulary=vocabulary, **kwargs)
+        return
+
+    if pool is None:
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            yield from build_graphs(
+                documents,
+                n,
+                Dwin,
+                graph_class,
+                pool=pool,
+                vocabulary=vocabulary,
+                chunksize=chunksize,
+                max_pending=max_pending or 2 * (workers or os.cpu_count()),
+                **kwargs
+            )
+        return
+
+    if max_pending is None:
+        max_pending = 2 * os.cpu_count()
+
+    chunks = _chunks(documents, chunksize)
+    pending = collections.deque()
+
+    for chunk in itertools.chain(chunks, [None]):
+        if chunk is not None:
+            pending.append(
+                pool.submit(
+                    _edge_arrays,
+                    chunk,
+                    n,
+                    Dwin,
+                    graph_class,
+                    vocabulary.spawn(),
+                    kwargs,
+                )
+            )
+
+            if len(pending) < max_pending:
+                continue
+
+        # wait for the oldest chunk, or drain what is left at the end
+        while pending:
+            worker_vocabulary, results = pending.popleft().result()
+            vocabulary.update(worker_vocabulary)
+
+            for edges in results:
+                graph = graph_class(n, Dwin, vocabulary=vocabulary, **kwargs)
+                if edges is not None:
+                    graph._add_edges(*edges)
+                yield graph
+
+            if chunk is not None:
+                break
+
+
+def build_graph(
+    document,
+    n=3,
+    Dwin=2,
+    graph_class=DocumentNGramGraph,
+    segments=None,
+    workers=None,
+    pool=None,
+    vocabulary=None,
+    **kwargs
+):
+    """Builds the graph of a single document in `segments` parallel parts.
+
+    Every part counts the edges of the n-grams starting in one segment of
+    the document, along with the symbols their windows reach into the next
+    and previous segments, and the parts are merged in document order.
+    The result has the same edges, weights and edge order as
+    ``graph_class(n, Dwin, document)``; as floating point sums depend on
+    the order of their terms, parts weighted by a kernel with fractional
+    weights (e.g. `DocumentNGramGaussNormGraph`) send back every weight
+    they count, to be added up in the order of a serial build.
+
+    `document` may be any sliceable sequence of symbols.  Parts are built
+    in `pool` if one is given, or else in a pool of `workers` processes
+    (all cores by default); there are as many parts as workers by default.
+    The graph is compact over `vocabulary` if one is given and any extra
+    keyword arguments are passed to `graph_class`.
+    """
+
+    graph = graph_class(n, Dwin, vocabulary=vocabulary, **kwargs)
+
+    if segments is None:
+        segments = workers or os.cpu_count()
+
+    positions = len(document) - n + 1
+    window = graph._window_offsets(max(positions, 1))
+
+    if window is None or positions <= 0 or segments <= 1:
+        graph.buildGraph(d=document)
+        return graph
+
+    if pool is None:
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            return build_graph(
+                document,
+                n,
+                Dwin,
+                graph_class,
+                segments,
+                pool=pool,
+                vocabulary=vocabulary,
+                **kwargs
+            )
+
+    offsets, weights = window
+    increments = not np.array_equal(weights, np.round(weights))
+
+    # symbols needed before and after the n-grams of a segment
+    before = max(-int(offsets.min()), 0)
+    after = max(int(offsets.max()), 0) + n - 1
+
+    bounds = np.linspace(0, positions, min(segments, positions) + 1).astype(int)
+
+    futures = []
+    for start, stop in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        first = max(start - before, 0)
+        futures.append(
+            pool.submit(
+                _segment_edge_arrays,
+                document[first : stop + after],
+                start - first,
+                stop - first,
+                n,
+                Dwin,
+                graph_class,
+                None if vocabulary is None else vocabulary.spawn(),
+                kwargs,
+                increments,
+            )
+        )
+
+    parts = []
+    for future in futures:
+        worker_vocabulary, edges = future.result()
+        if vocabulary is not None:
+            vocabulary.update(worker_vocabulary)
+
+        # (segments of a single n-gram have no edges)
+        if edges is not None:
+            parts.append(edges)
+
+    if parts:
+        graph._add_edges(*_merge_segments(parts, graph._directed, increments))
+    return graph
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# runs in the workers: counts the edges of every document of a chunk,
+# returning the vocabulary the vertex ids were drawn from with them
+def _edge_arrays(documents, n, Dwin, graph_class, vocabulary, kwargs):
+    results = []
+
+    for document in documents:
+        graph = graph_class(n, Dwin, vocabulary=vocabulary, **kwargs)
+        graph.setData(document)
+
+        results.append(graph._edge_arrays())
+
+    return vocabulary, results
+
+
+# runs in the workers: counts the edges of the n-grams starting
+# at positions start to stop of a segment of a document
+def _segment_edge_arrays(
+    segment, start, stop, n, Dwin, graph_class, vocabulary, kwargs, increments
+):
+    graph = graph_class(n, Dwin, vocabulary=vocabulary, **kwargs)
+
+    return vocabulary, graph._edge_arrays(
+        encode_symbols(segment), start, stop, increments
+    )
+
+
+# merges the edges of consecutive segments as _add_edges takes
+# them: edges are numbered in order of first appearance and
+# weights added up as a single pass over the document would
+def _merge_segments(parts, directed, increments):
+    vertex_ids = {}
+    edge_ids = {}
+
+    sources, targets, firsts = [], [], []
+    totals = np.zeros(0)
+
+    for vertices, *edges in parts:
+        if increments:
+            source, target, _, first, inverse, weights = edges
+        else:
+            source, target, weights, first = edges
+            inverse = np.arange(len(weights))
+
+        labels = vertices.tolist() if isinstance(vertices, np.ndarray) else vertices
+        ids = np.fromiter(
+            (vertex_ids.setdefault(label, len(vertex_ids)) for label in labels),
+            np.int64,
+            len(labels),
+        )
+        source, target = ids[source], ids[target]
+
+        if directed:
+            keys = (source << 32) | target
+        else:
+            keys = (np.minimum(source, target) << 32) | np.maximum(source, target)
+
+        known = len(edge_ids)
+        slots = np.fromiter(
+            (edge_ids.setdefault(key, len(edge_ids)) for key in keys.tolist()),
+            np.int64,
+            len(keys),
+        )
+
+        # the totals so far come first, so that weights are added
+        # in the same order as in a single pass
+        totals = np.bincount(
+            np.concatenate((np.arange(known), slots[inverse])),
+            weights=np.concatenate((totals, weights)),
+            minlength=len(edge_ids),
+        )
+
+        new = np.flatnonzero(slots >= known)
+        sources.append(source[new])
+        targets.append(target[new])
+        firsts.append(first[new])
+
+    if parts[0][4].dtype.kind in "iub":
+        totals = totals.astype(np.int64)
+
+    labels = list(vertex_ids)
+    if isinstance(parts[0][0], np.ndarray):
+        labels = np.array(labels, parts[0][0].dtype)
+
+    return (
+        labels,
+        np.concatenate(sources),
+        np.concatenate(targets),
+        totals,
+        np.concatenate(firsts),
+    )
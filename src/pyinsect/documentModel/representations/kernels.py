@@ -0,0 +1,108 @@
+"""
+  kernels.py
+
+  Weighting kernels for the edges of windowed n-gram graphs.
+
+"""
+
+import logging
+import math
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class Kernel(object):
+    """Weighs the co-occurrence of two n-grams by their distance in a window.
+
+    Subclasses define `weight`; graphs evaluate it once per distance through
+    `table`.  With `digits`, weights are rounded to that many decimals.
+    """
+
+    def __init__(self, digits=None):
+        self._digits = digits
+
+    def __call__(self, distance):
+        return self.weight(distance)
+
+    def __repr__(self):
+        return "<{0} digits={1}>".format(self.__class__.__name__, self._digits)
+
+    def weight(self, distance):
+        raise NotImplementedError
+
+    def table(self, window):
+        """Returns the weights of distances 1 to `window`, as an array."""
+
+        weights = [self.weight(distance) for distance in range(1, window + 1)]
+
+        if self._digits is not None:
+            weights = [float(format(w, ".{0}f".format(self._digits))) for w in weights]
+
+        return np.array(weights)
+
+
+class ConstantKernel(Kernel):
+    """Counts co-occurrences: every distance weighs `value`."""
+
+    def __init__(self, value=1, digits=None):
+        super().__init__(digits)
+
+        self._value = value
+
+    def weight(self, distance):
+        return self._value
+
+
+class GaussianKernel(Kernel):
+    """The weighting of `DocumentNGramGaussNormGraph`.
+
+    Note that, as in the original graph, the weight is ``a * exp(-x / b)``
+    with the normal density's ``a`` and ``b``, i.e. the distance is not squared.
+    """
+
+    def __init__(self, sigma=1, digits=None):
+        super().__init__(digits)
+
+        self._a = 1.0 / (sigma * math.sqrt(2 * math.pi))
+        self._b = 2.0 * (sigma ** 2)
+
+    def weight(self, distance):
+        return self._a * math.exp(-(distance * 1.0) / self._b)
+
+
+class LinearKernel(Kernel):
+    """Decays linearly from 1 at distance 1 to 0 past distance `width`."""
+
+    def __init__(self, width, digits=None):
+        super().__init__(digits)
+
+        self._width = width
+
+    def weight(self, distance):
+        return max(self._width + 1 - distance, 0) / self._width
+
+
+class InverseKernel(Kernel):
+    """Weighs distance `x` as ``1 / x ** power``."""
+
+    def __init__(self, power=1, digits=None):
+        super().__init__(digits)
+
+        self._power = power
+
+    def weight(self, distance):
+        return 1.0 / distance ** self._power
+
+
+class FunctionKernel(Kernel):
+    """Weighs distances by a user defined `function` of the distance."""
+
+    def __init__(self, function, digits=None):
+        super().__init__(digits)
+
+        self._function = function
+
+    def weight(self, distance):
+        return self._function(distance)
@@ -0,0 +1,121 @@
+"""
+  multi_rank.py
+
+  The n-gram graphs of a document for several ranks, built together.
+
+"""
+
+import logging
+
+from pyinsect.documentModel.representations.DocumentNGramGraph import DocumentNGramGraph
+from pyinsect.documentModel.representations.vectorized import (
+    aggregate_edges,
+    encode_symbols,
+    ngram_ids_by_rank,
+    window_pairs,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class MultiRankNGramGraph(object):
+    """Holds a `graph_type` graph of the same data for every n in `ranks`.
+
+    The data is encoded once and the n-grams of every rank are derived from
+    those of the rank below, instead of scanning the document once per rank;
+    each graph is the one `graph_type(n, Dwin, Data)` would build.  Extra
+    keyword arguments (e.g. a shared `vocabulary` or a `kernel`) are passed
+    to every graph.
+    """
+
+    def __init__(
+        self,
+        ranks=(1, 2, 3, 4, 5),
+        Dwin=2,
+        Data=[],
+        graph_type=DocumentNGramGraph,
+        **kwargs
+    ):
+        self._ranks = sorted(set(ranks))
+        self._Dwin = Dwin
+
+        self._graphs = {n: graph_type(n, Dwin, **kwargs) for n in self._ranks}
+
+        if len(Data) > 0:
+            self.buildGraph(d=Data)
+
+    def __len__(self):
+        return sum(len(graph) for graph in self)
+
+    def __eq__(self, other):
+        if not isinstance(other, MultiRankNGramGraph):
+            return NotImplemented
+        return self._ranks == other._ranks and all(
+            graph == other[n] for n, graph in self._graphs.items()
+        )
+
+    def __getitem__(self, n):
+        return self._graphs[n]
+
+    def __iter__(self):
+        for n in self._ranks:
+            yield self._graphs[n]
+
+    def __str__(self):
+        return "ranks: {0}, window size: {1}, edges: {2}".format(
+            self._ranks, self._Dwin, len(self)
+        )
+
+    def __repr__(self):
+        return '<{0} "{1}">'.format(self.__class__.__name__, str(self))
+
+    @property
+    def ranks(self):
+        return list(self._ranks)
+
+    def buildGraph(self, verbose=False, d=[]):
+        """(Re)builds the graphs of every rank over data `d`."""
+
+        codes, decode = encode_symbols(d)
+
+        for graph in self:
+            graph.clear()
+            # (the data is not kept by the graphs)
+            graph._ngram = None
+
+        labels, previous = None, None
+
+        for n, ids, first in ngram_ids_by_rank(codes, self._ranks[-1]):
+            # every n-gram extends an (n - 1)-gram by a symbol
+            if labels is None:
+                labels = [(decode(code),) for code in codes[first].tolist()]
+            else:
+                labels = [
+                    labels[gram] + (decode(code),)
+                    for gram, code in zip(
+                        previous[first].tolist(), codes[first + n - 1].tolist()
+                    )
+                ]
+            previous = ids
+
+            if n not in self._graphs:
+                continue
+
+            graph = self._graphs[n]
+
+            window = graph._window_offsets(len(ids))
+            if window is None:
+                continue
+
+            sources, targets, weights = window_pairs(ids, *window)
+            graph._add_edges(
+                labels,
+                *aggregate_edges(
+                    sources, targets, weights, len(labels), graph._directed
+                )
+            )
+
+            if verbose:
+                graph.GraphDraw(graph._GPrintVerbose)
+
+        return self
@@ -0,0 +1,453 @@
+"""
+  vectorized.py
+
+  NumPy building blocks for constructing n-gram graphs
+  without a Python call per edge increment.
+
+"""
+
+import codecs
+import logging
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from pyinsect.structs.grouping import group_keys
+
+logger = logging.getLogger(__name__)
+
+
+def encode_symbols(data, symbols=None):
+    """Encodes a sequence of symbols as an integer array.
+
+    Returns the codes together with a function turning a code back into
+    the symbol it stands for.  Symbols other than characters, bytes and
+    integers are numbered in order of appearance; given a `symbols` dict,
+    any sequence that is not a string, bytes or an array is numbered
+    through it, consistently across calls.
+    """
+
+    if isinstance(data, str):
+        return _encode_text(data)
+
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        # a view, bytes are not copied
+        return np.frombuffer(data, dtype=np.uint8), int
+
+    if (
+        isinstance(data, np.ndarray)
+        and data.dtype.kind in "iu"
+        and (data.size == 0 or 0 <= data.min() and data.max() < 2 ** 62)
+    ):
+        return data.astype(np.int64), data.dtype.type
+
+    data = list(data)
+
+    # a list of characters, as produced by setData on a string
+    if symbols is None and data and "" not in data:
+        try:
+            text = "".join(data)
+        except TypeError:
+            pass
+        else:
+            if len(text) == len(data):
+                return _encode_text(text)
+
+    if symbols is None:
+        symbols = {}
+    codes = np.fromiter(
+        (symbols.setdefault(symbol, len(symbols)) for symbol in data),
+        np.int64,
+        len(data),
+    )
+
+    return codes, list(symbols).__getitem__
+
+
+def decode_range(data, encoding, start, stop, before=0, after=0):
+    """Decodes the characters of encoded text starting in bytes `start` to `stop`.
+
+    `data` is the text as a ``uint8`` array.  Up to `before` characters
+    preceding and `after` characters following the range are decoded along
+    with it; returns the text and the span of the characters of the range
+    within it.  Ranges falling inside a character move forward to the next
+    one, so consecutive ranges split the text between them.
+    """
+
+    if start > 0 or stop < len(data):
+        width, boundary = _char_boundary(encoding)
+
+        def align(position):
+            while 0 < position < len(data) and not boundary(data[position]):
+                position += 1
+            return position
+
+    else:
+        # the whole of the text
+        width, align = 0, lambda position: position
+
+    start, stop = align(start), align(stop)
+
+    head = codecs.decode(data[align(max(start - width * before, 0)) : start], encoding)
+    body = codecs.decode(data[start:stop], encoding)
+    tail = codecs.decode(
+        data[stop : align(min(stop + width * after, len(data)))], encoding
+    )
+
+    head = head[max(len(head) - before, 0) :]
+    tail = tail[:after]
+
+    return head + body + tail, len(head), len(head) + len(body)
+
+
+# the maximum width of a character in encoding and a test
+# of whether a byte is the first one of a character
+def _char_boundary(encoding):
+    if codecs.lookup(encoding).name == "utf-8":
+        # continuation bytes are 10xxxxxx
+        return 4, lambda byte: byte & 0xC0 != 0x80
+
+    if len(codecs.decode(bytes(range(256)), encoding, "replace")) == 256:
+        return 1, lambda byte: True
+
+    raise ValueError(
+        "Byte ranges of text need utf-8 or a single byte encoding, not {0!r}".format(
+            encoding
+        )
+    )
+
+
+def _encode_text(text):
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+
+    return codes.astype(np.int64), chr
+
+
+def ngram_ids(codes, n):
+    """Gives every n-gram of `codes` a dense id.
+
+    Returns `(ids, grams)`, the id of the n-gram starting at each position
+    and, indexed by id, the codes every distinct n-gram consists of.
+    """
+
+    if n < 1 or len(codes) < n:
+        return np.empty(0, np.int64), np.empty((0, n), np.int64)
+
+    windows = sliding_window_view(codes, n)
+
+    base = int(codes.max()) + 1
+
+    if base ** n < 2 ** 63:
+        # pack each n-gram in a single integer
+        keys = np.zeros(len(windows), np.int64)
+        for column in range(n):
+            keys = keys * base + windows[:, column]
+
+        _, first, ids = group_keys(keys, base ** n)
+    else:
+        _, first, ids = np.unique(
+            windows, axis=0, return_index=True, return_inverse=True
+        )
+
+    return ids.reshape(-1), windows[first]
+
+
+def ngram_ids_by_rank(codes, max_rank):
+    """Gives the n-grams of `codes` dense ids for every n up to `max_rank`.
+
+    Yields `(n, ids, first)` per rank: the id of the n-gram starting at each
+    position and the first position of every id.  The n-grams of a rank are
+    those of the previous rank extended by a symbol, so each rank is keyed
+    by a single multiply-add over the ids of the one before it.
+    """
+
+    if len(codes) == 0 or max_rank < 1:
+        return
+
+    symbols, first, unigrams = group_keys(codes, int(codes.max()) + 1)
+    ids = unigrams
+
+    yield 1, ids, first
+
+    for n in range(2, min(max_rank, len(codes)) + 1):
+        keys = ids[:-1] * len(symbols) + unigrams[n - 1 :]
+
+        _, first, ids = group_keys(keys, len(first) * len(symbols))
+
+        yield n, ids, first
+
+
+def window_pairs(ids, offsets, weights, start=0, stop=None):
+    """Pairs every n-gram with its neighbours at the given `offsets`.
+
+    Pairs are emitted position by position and, for every position, in the
+    order of `offsets`, which is the order a sequential window scan visits
+    them in.  Only the n-grams at positions `start` to `stop` are paired,
+    though with neighbours anywhere in `ids`.
+    Returns the `(sources, targets, weights)` arrays.
+    """
+
+    offsets = np.asarray(offsets, np.int64)
+
+    stop = len(ids) if stop is None else stop
+    positions = np.arange(start, stop)[:, None]
+    neighbours = positions + offsets[None, :]
+
+    valid = (neighbours >= 0) & (neighbours < len(ids))
+
+    sources = ids[np.broadcast_to(positions, neighbours.shape)[valid]]
+    targets = ids[neighbours[valid]]
+    weights = np.broadcast_to(np.asarray(weights), neighbours.shape)[valid]
+
+    return sources, targets, weights
+
+
+def aggregate_edges(
+    sources, targets, weights, number_of_ids, directed=True, return_inverse=False
+):
+    """Sums the weights of repeated `(source, target)` pairs.
+
+    Returns `(sources, targets, totals, firsts)` with one entry per distinct
+    edge, in order of first appearance and in the orientation it first
+    appeared in.  `firsts` holds the first increment of every edge.
+    Weights are summed in input order, exactly as repeated additions would.
+    With `return_inverse`, the edge of every pair is returned as well.
+    """
+
+    if directed:
+        keys = sources * number_of_ids + targets
+    else:
+        keys = np.minimum(sources, targets) * number_of_ids + np.maximum(
+            sources, targets
+        )
+
+    _, first, inverse = group_keys(keys, number_of_ids ** 2)
+
+    totals = np.bincount(inverse.reshape(-1), weights=weights, minlength=len(first))
+    if weights.dtype.kind in "iub":
+        totals = totals.astype(np.int64)
+
+    order = np.argsort(first, kind="stable")
+    first = first[order]
+
+    edges = sources[first], targets[first], totals[order], weights[first]
+    if not return_inverse:
+        return edges
+
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return edges + (rank[inverse.reshape(-1)],)
+
+
+class EdgeCounter(object):
+    """Counts the edges of a document that is fed in consecutive chunks.
+
+    Only the last symbols of the data seen so far are kept, as many as the
+    n-grams still to be paired need, along with the distinct n-grams and
+    edges.  An n-gram is paired once all its neighbours at `offsets` have
+    been seen, so pairs are counted in the order of a single scan over the
+    whole document and `finish` returns exactly what `aggregate_edges`
+    would on the concatenation of the chunks.
+
+    With `max_edges`, at most twice as many edges are tracked, as in a
+    (batched) Misra-Gries summary: whenever there are more, the weight of
+    the ``max_edges + 1``-th heaviest is taken off all of them and only
+    those left with a positive weight are kept.  `finish` then returns at
+    most `max_edges` edges, with the weights they gathered since they were
+    last taken in; every edge (missing ones weighing 0) weighs at least
+    that much and at most `error` more in the document, where `error`, the
+    total weight taken off, is at most ``N / (max_edges + 1)`` for a
+    document with edge weights summing to N.
+    """
+
+    def __init__(self, n, offsets, weights, directed=True, max_edges=None):
+        self._n = n
+        self._offsets = np.asarray(offsets, np.int64)
+        self._weights = np.broadcast_to(np.asarray(weights), self._offsets.shape)
+        self._directed = directed
+        self._max_edges = max_edges
+
+        # how far neighbours lie ahead of and behind an n-gram
+        self._ahead = max(int(self._offsets.max(initial=0)), 0)
+        self._behind = max(-int(self._offsets.min(initial=0)), 0)
+
+        self._symbols = {}
+        self._decode = None
+
+        # the data kept, and the position of its first unpaired n-gram
+        self._carry = np.empty(0, np.int64)
+        self._start = 0
+
+        # codes of the distinct n-grams, by id
+        self._grams = {}
+
+        # the distinct edges by (packed) key, in order of first appearance
+        self._edges = {}
+        self._sources = []
+        self._targets = []
+        self._firsts = []
+        self._totals = np.zeros(0)
+
+        # the weight taken off all edges so far (see max_edges), and
+        # what of it had been taken off when each edge was taken in
+        self.error = 0
+        self._taken = np.zeros(0)
+
+    def __len__(self):
+        return len(self._edges)
+
+    def update(self, chunk):
+        """Counts the edges completed by the next chunk of data."""
+
+        codes, self._decode = encode_symbols(chunk, self._symbols)
+        self._count(np.concatenate((self._carry, codes)), final=False)
+
+    def finish(self):
+        """Counts the remaining edges and returns all of them.
+
+        Returns `(vertices, sources, targets, totals, firsts)`, the label of
+        every n-gram followed by the output of `aggregate_edges`.
+        """
+
+        self._count(self._carry, final=True)
+
+        if self._max_edges is not None and len(self) > self._max_edges:
+            self._reduce()
+
+        decode = self._decode
+        vertices = [tuple(map(decode, gram)) for gram in self._grams]
+
+        totals = self._totals[: len(self)]
+        if self._weights.dtype.kind in "iub":
+            totals = totals.astype(np.int64)
+
+        return (
+            vertices,
+            np.concatenate(self._sources or [np.empty(0, np.int64)]),
+            np.concatenate(self._targets or [np.empty(0, np.int64)]),
+            totals,
+            np.concatenate(self._firsts or [self._weights[:0]]),
+        )
+
+    def _count(self, data, final):
+        positions = len(data) - self._n + 1 if self._n >= 1 else 0
+
+        stop = positions if final else positions - self._ahead
+        if stop > self._start:
+            local, grams = ngram_ids(data, self._n)
+
+            # number the n-grams across chunks
+            ids = np.fromiter(
+                (
+                    self._grams.setdefault(gram, len(self._grams))
+                    for gram in map(tuple, grams.tolist())
+                ),
+                np.int64,
+                len(grams),
+            )[local]
+
+            self._add(
+                *window_pairs(ids, self._offsets, self._weights, self._start, stop)
+            )
+            self._start = stop
+
+            if self._max_edges is not None and len(self) > 2 * self._max_edges:
+                self._reduce()
+
+        # keep what the neighbours of the unpaired n-grams need
+        keep = max(self._start - self._behind, 0)
+        self._carry = data[keep:]
+        self._start -= keep
+
+    def _add(self, sources, targets, weights):
+        if len(sources) == 0:
+            return
+
+        grams = len(self._grams)
+        if self._directed:
+            keys = sources * grams + targets
+        else:
+            keys = np.minimum(sources, targets) * grams + np.maximum(sources, targets)
+
+        unique, first, inverse = group_keys(keys, grams ** 2)
+
+        # edges are kept by keys that do not change as n-grams are added
+        unique = ((unique // grams) << 32) | (unique % grams)
+
+        slots = np.fromiter(
+            (self._edges.get(key, -1) for key in unique.tolist()), np.int64, len(unique)
+        )
+        known = np.flatnonzero(slots >= 0)
+
+        # the totals so far come first, so that weights are added
+        # in the same order as in a single pass
+        totals = np.bincount(
+            np.concatenate((known, inverse.reshape(-1))),
+            weights=np.concatenate((self._totals[slots[known]], weights)),
+            minlength=len(unique),
+        )
+        self._totals[slots[known]] = totals[known]
+
+        new = np.flatnonzero(slots < 0)
+        new = new[np.argsort(first[new], kind="stable")]
+
+        size = len(self)
+        for key in unique[new].tolist():
+            self._edges[key] = len(self._edges)
+
+        if len(self) > len(self._totals):
+            capacity = max(len(self), 2 * len(self._totals))
+            self._totals = np.resize(self._totals, capacity)
+            self._taken = np.resize(self._taken, capacity)
+        self._totals[size : len(self)] = totals[new]
+        self._taken[size : len(self)] = self.error
+
+        first = first[new]
+        self._sources.append(sources[first])
+        self._targets.append(targets[first])
+        self._firsts.append(weights[first])
+
+    # the Misra-Gries step: takes the weight of the max_edges + 1-th
+    # heaviest edge off all edges, dropping those left without weight
+    # along with the n-grams no edge is left on
+    def _reduce(self):
+        size = len(self)
+        totals = self._totals[:size]
+
+        # the weight of every edge net of what was taken off since
+        counts = totals - (self.error - self._taken[:size])
+        cut = np.partition(counts, size - self._max_edges - 1)[
+            size - self._max_edges - 1
+        ]
+        self.error += cut.item()
+
+        keep = np.flatnonzero(counts > cut)
+
+        sources = np.concatenate(self._sources)[keep]
+        targets = np.concatenate(self._targets)[keep]
+
+        # renumber the n-grams that are still used, in their order
+        used = np.zeros(len(self._grams), bool)
+        used[sources] = True
+        used[targets] = True
+        ids = np.cumsum(used) - 1
+        sources, targets = ids[sources], ids[targets]
+
+        self._grams = {
+            gram: index
+            for index, gram in enumerate(
+                gram for gram, flag in zip(self._grams, used.tolist()) if flag
+            )
+        }
+
+        if self._directed:
+            keys = (sources << 32) | targets
+        else:
+            keys = (np.minimum(sources, targets) << 32) | np.maximum(sources, targets)
+
+        self._edges = dict(zip(keys.tolist(), range(len(keep))))
+        self._sources = [sources]
+        self._targets = [targets]
+        self._firsts = [np.concatenate(self._firsts)[keep]]
+        self._totals = totals[keep]
+        self._taken = self._taken[keep]
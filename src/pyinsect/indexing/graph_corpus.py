@@ -0,0 +1,239 @@
+"""
+  graph_corpus.py
+
+  Packs a corpus of n-gram graphs into arrays, to score a query graph
+  against all of them at once.
+
+"""
+
+import logging
+
+import numpy as np
+
+from pyinsect.documentModel.comparators.NGramGraphSimilarity import (
+    SimilarityNVS,
+    SimilaritySS,
+    SimilarityVS,
+)
+from pyinsect.structs.edge_store import EdgeStore
+from pyinsect.structs.vocabulary import Vocabulary
+
+logger = logging.getLogger(__name__)
+
+
+class GraphCorpus(object):
+    """Holds the weighted edges of many graphs of one type in CSR arrays.
+
+    Every distinct edge of the corpus is numbered, and every graph is kept
+    as the ids and weights of its edges; `similarities` scores a query
+    against all graphs through the postings (the graphs holding each edge),
+    so its cost is that of the query's edges and their postings rather than
+    one similarity call per graph.
+
+    Edges are identified over `vocabulary` (by default, that of the first
+    graph if it is compact, or else a new `Vocabulary`); graphs compact over
+    a compatible vocabulary are added by their vertex ids, any other graph
+    by its n-grams.
+    """
+
+    # the metrics similarities computes, by name
+    metrics = ("SS", "VS", "NVS")
+
+    def __init__(self, graphs=(), vocabulary=None):
+        self._vocabulary = vocabulary
+        self._directed = None
+
+        # edge id of every packed edge key
+        self._edge_ids = {}
+
+        # the edge ids and weights of every graph
+        self._edges = []
+        self._weights = []
+
+        # the sizes SS and VS are computed from, per graph
+        self._sizes = []
+        self._lengths = []
+
+        # postings, built on demand from the above
+        self._postings = None
+
+        self.extend(graphs)
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def __str__(self):
+        return "graphs: {0}, edges: {1}".format(len(self), len(self._edge_ids))
+
+    def __repr__(self):
+        return '<{0} "{1}">'.format(self.__class__.__name__, str(self))
+
+    @property
+    def vocabulary(self):
+        return self._vocabulary
+
+    def add(self, graph):
+        """Adds a graph, returning its index in the corpus."""
+
+        if self._vocabulary is None:
+            store = graph.getEdgeStore()
+            self._vocabulary = Vocabulary() if store is None else store.vocabulary
+
+        if self._directed is None:
+            self._directed = graph._directed
+        elif self._directed != graph._directed:
+            raise ValueError("Corpus graphs must all be directed or undirected")
+
+        self._add_weights(
+            self._edge_weights(graph, intern=True), graph.number_of_edges()
+        )
+
+        return len(self) - 1
+
+    # adds a graph of size vertices by its edge weights
+    def _add_weights(self, weights, size):
+        edge_ids = self._edge_ids
+        self._edges.append(
+            np.fromiter(
+                (edge_ids.setdefault(key, len(edge_ids)) for key in weights),
+                np.int64,
+                len(weights),
+            )
+        )
+        self._weights.append(np.fromiter(weights.values(), np.float64, len(weights)))
+
+        self._sizes.append(size)
+        self._lengths.append(len(weights))
+
+        self._postings = None
+
+    def extend(self, graphs):
+        for graph in graphs:
+            self.add(graph)
+
+    def similarities(self, query, metric="NVS"):
+        """Returns the similarity of `query` to every graph, as an array.
+
+        `metric` is one of "SS", "VS" and "NVS", or the equivalent
+        `Similarity`; the scores are those of the metric called on
+        ``(query, graph)``.
+        """
+
+        name = self.metric_name(metric)
+        if name is None:
+            raise ValueError("Unknown corpus metric {0!r}".format(metric))
+
+        return self._similarities(
+            self._edge_weights(query, intern=False),
+            query.number_of_edges(),
+            len(query),
+            name,
+        )
+
+    @classmethod
+    def metric_name(cls, metric):
+        """Returns the name of the corpus metric `metric` stands for, or None."""
+
+        if isinstance(metric, SimilarityNVS):
+            return "NVS"
+        if isinstance(metric, SimilarityVS):
+            return "VS"
+        if isinstance(metric, SimilaritySS):
+            return "SS"
+
+        return metric if metric in cls.metrics else None
+
+    # the similarities of a query of the given edge weights, size
+    # (vertices) and length (edges) to every graph
+    def _similarities(self, weights, size, length, metric):
+        sizes = np.array(self._sizes, np.float64)
+
+        largest = np.maximum(sizes, size)
+        SS = np.divide(
+            np.minimum(sizes, size),
+            largest,
+            out=np.zeros(len(self)),
+            where=largest > 0,
+        )
+        if metric == "SS":
+            return SS
+
+        lengths = np.array(self._lengths, np.float64)
+
+        largest = np.maximum(lengths, length)
+        VS = np.divide(
+            self._ratio_sums(weights),
+            largest,
+            out=np.ones(len(self)),
+            where=largest > 0,
+        )
+        if metric == "VS":
+            return VS
+
+        return np.divide(VS, SS, out=np.zeros(len(self)), where=SS > 0)
+
+    # sums min(w1, w2) / max(w1, w2) over the edges of the given
+    # weights and every graph
+    def _ratio_sums(self, weights):
+        edge_ids = self._edge_ids
+        edges = np.fromiter(
+            (edge_ids.get(key, -1) for key in weights), np.int64, len(weights)
+        )
+        found = edges >= 0
+
+        edges = edges[found]
+        query_weights = np.fromiter(weights.values(), np.float64, len(weights))[found]
+
+        indptr, graphs, posting_weights = self._get_postings()
+
+        # the postings of every edge, one after the other
+        starts = indptr[edges]
+        counts = indptr[edges + 1] - starts
+        rows = np.repeat(np.arange(len(edges)), counts)
+        index = np.arange(len(rows)) + np.repeat(
+            starts - np.cumsum(counts) + counts, counts
+        )
+
+        w1 = query_weights[rows]
+        w2 = posting_weights[index]
+
+        return np.bincount(
+            graphs[index],
+            weights=np.minimum(w1, w2) / np.maximum(w1, w2),
+            minlength=len(self),
+        )
+
+    # the graphs and weights of every edge, as CSR arrays
+    # over edge ids
+    def _get_postings(self):
+        if self._postings is None:
+            edges = np.concatenate(self._edges or [np.empty(0, np.int64)])
+            weights = np.concatenate(self._weights or [np.empty(0)])
+            graphs = np.repeat(np.arange(len(self)), self._lengths)
+
+            order = np.argsort(edges, kind="stable")
+            indptr = np.zeros(len(self._edge_ids) + 1, np.int64)
+            np.cumsum(np.bincount(edges, minlength=len(self._edge_ids)), out=indptr[1:])
+
+            self._postings = indptr, graphs[order], weights[order]
+
+        return self._postings
+
+    # the weights of the edges of a graph by packed key; edges
+    # over n-grams the vocabulary does not know are left out
+    # unless intern is set
+    def _edge_weights(self, graph, intern):
+        store = graph.getEdgeStore()
+        if store is not None and store.vocabulary.compatible_with(self._vocabulary):
+            return store.weights
+
+        vocabulary = self._vocabulary
+        lookup = vocabulary.intern if intern else vocabulary.get
+
+        store = EdgeStore(vocabulary, directed=graph._directed)
+        for a, b, w in graph.weighted_edges():
+            u, v = lookup(a), lookup(b)
+            if u is not None and v is not None:
+                store.set(u, v, w)
+
+        return store.weights
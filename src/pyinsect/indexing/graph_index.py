@@ -40,7 +40,26 @@ class GraphIndex(object):
                 index,
             )
 
-            similarity = self.similarity_metric(graph, other_graph)
+            # only similarities clearing a margin matter (or, for
+            # a margin this close to 1, whether they are 1)
+            similarity = self.similarity_metric.similarity_at_least(
+                graph, other_graph, min(self.minimum_merging_margin, 1.0 - 10e-5)
+            )
+
+            if similarity is None:
+                logger.debug(
+                    "The similarity between graph %s and %s is below %05.3f",
+                    graph,
+                    other_graph,
+                    self.minimum_merging_margin,
+                )
+                logger.debug(
+                    "No match yet. Perform inversely intersect graph %s with existing graph %s",
+                    graph,
+                    other_graph,
+                )
+                graph = self.all_not_in(graph, other_graph, dc=self._deep_copy)
+                continue
 
             logger.debug(
                 "The similarity between graph %s and %s is %05.3f",
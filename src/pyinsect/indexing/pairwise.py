@@ -0,0 +1,184 @@
+"""
+  pairwise.py
+
+  Computes the similarity matrix of every pair of a set of graphs, in
+  square blocks spread over a process pool.
+
+"""
+
+import collections
+import concurrent.futures
+import logging
+import os
+
+import numpy as np
+
+from pyinsect.documentModel.comparators.NGramGraphSimilarity import SimilarityNVS
+from pyinsect.indexing.graph_corpus import GraphCorpus
+from pyinsect.structs.vocabulary import Vocabulary
+
+logger = logging.getLogger(__name__)
+
+
+def all_pairs_similarity(
+    graphs,
+    metric=None,
+    workers=None,
+    block_size=256,
+    pool=None,
+    out=None,
+    max_pending=None,
+):
+    """Returns the float32 matrix of `metric` over every pair of `graphs`.
+
+    Entry ``[i, j]`` is ``metric(graphs[i], graphs[j])`` (`SimilarityNVS`
+    by default).  The matrix is computed in blocks of `block_size` by
+    `block_size` pairs, of which only those on and above the diagonal
+    when the metric is commutative, and written to `out`: a preallocated
+    ``(N, N)`` array, the path of a ``.npy`` file to memory map, or None
+    for a new array.
+
+    Blocks are computed in `pool` if one is given, or else in a pool of
+    `workers` processes (all cores by default), while ``workers=0``
+    computes them in this process; at most `max_pending` blocks are in
+    flight at any time (twice the number of workers by default).
+    SS, VS and NVS blocks are scored as a `GraphCorpus` and only send
+    the edge weights of their graphs to the workers; any other metric is
+    called on every pair of graphs.
+    """
+
+    if metric is None:
+        metric = SimilarityNVS()
+
+    graphs = list(graphs)
+    out = _output(out, len(graphs))
+
+    if pool is None and workers != 0:
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            return all_pairs_similarity(
+                graphs,
+                metric,
+                block_size=block_size,
+                pool=pool,
+                out=out,
+                max_pending=max_pending or 2 * (workers or os.cpu_count()),
+            )
+
+    if max_pending is None:
+        max_pending = 2 * os.cpu_count()
+
+    commutative = getattr(metric, "_commutative", False)
+    pending = collections.deque()
+
+    for rows, columns, function, args in _blocks(
+        graphs, metric, block_size, commutative
+    ):
+        if pool is None:
+            _write(out, rows, columns, function(*args), commutative)
+            continue
+
+        pending.append((rows, columns, pool.submit(function, *args)))
+
+        while len(pending) >= max_pending:
+            rows, columns, future = pending.popleft()
+            _write(out, rows, columns, future.result(), commutative)
+
+    while pending:
+        rows, columns, future = pending.popleft()
+        _write(out, rows, columns, future.result(), commutative)
+
+    if isinstance(out, np.memmap):
+        out.flush()
+
+    return out
+
+
+def _output(out, size):
+    if out is None:
+        return np.empty((size, size), np.float32)
+
+    if isinstance(out, (str, os.PathLike)):
+        return np.lib.format.open_memmap(
+            out, mode="w+", dtype=np.float32, shape=(size, size)
+        )
+
+    if out.shape != (size, size):
+        raise ValueError(
+            "Expected a {0}x{0} output matrix, got {1}".format(size, out.shape)
+        )
+
+    return out
+
+
+# yields the rows and columns of every block, along with the
+# function computing it in the workers and its arguments
+def _blocks(graphs, metric, block_size, commutative):
+    bounds = list(range(0, len(graphs), block_size))
+    name = GraphCorpus.metric_name(metric)
+
+    if name is not None:
+        # key the edges of all graphs once, over the vocabulary
+        # of the first compact graph if there is one
+        vocabulary = next(
+            (g.getEdgeStore().vocabulary for g in graphs if g.is_compact()), None
+        )
+        corpus = GraphCorpus(vocabulary=vocabulary or Vocabulary())
+
+        items = [
+            (corpus._edge_weights(graph, intern=True), graph.number_of_edges())
+            for graph in graphs
+        ]
+
+    for i in bounds:
+        rows = slice(i, min(i + block_size, len(graphs)))
+
+        for j in bounds:
+            if commutative and j < i:
+                continue
+
+            columns = slice(j, min(j + block_size, len(graphs)))
+
+            if name is not None:
+                args = items[rows], items[columns], name
+                yield rows, columns, _corpus_block, args
+            else:
+                args = graphs[rows], graphs[columns], metric, commutative and i == j
+                yield rows, columns, _metric_block, args
+
+
+def _write(out, rows, columns, block, commutative):
+    if commutative and rows == columns:
+        # diagonal blocks may only hold their upper triangle
+        block = np.triu(block) + np.triu(block, 1).T
+
+    out[rows, columns] = block
+
+    if commutative and rows != columns:
+        out[columns, rows] = block.T
+
+
+# runs in the workers: scores every row against a corpus of
+# the columns, both given as (edge weights, size) pairs
+def _corpus_block(rows, columns, metric):
+    corpus = GraphCorpus()
+    for weights, size in columns:
+        corpus._add_weights(weights, size)
+
+    block = np.empty((len(rows), len(columns)), np.float32)
+    for index, (weights, size) in enumerate(rows):
+        block[index] = corpus._similarities(weights, size, len(weights), metric)
+
+    return block
+
+
+# runs in the workers: calls the metric on every pair, only
+# above the diagonal with upper set
+def _metric_block(rows, columns, metric, upper):
+    block = np.zeros((len(rows), len(columns)), np.float32)
+
+    for i, graph1 in enumerate(rows):
+        first = i if upper else 0
+        for j, graph2 in enumerate(columns[first:], first):
+            block[i, j] = metric(graph1, graph2)
+
+    return block
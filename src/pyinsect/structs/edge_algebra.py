@@ -0,0 +1,88 @@
+"""
+  edge_algebra.py
+
+  Set operations over the edges of compact graphs, given as sorted packed
+  edge keys with parallel weight arrays (see EdgeStore.key_arrays).
+
+  Every operation returns the sorted keys and weights of its result, along
+  with the weights it set anew (e.g. the merged weights of common edges),
+  by which graphs keep their weight bounds up to date.
+
+"""
+
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def union(keys1, weights1, keys2, weights2, learning_factor=0.5):
+    """The edges of either graph, as `DocumentNGramGraph.union`.
+
+    Common edges weigh ``learning_factor * w2 + (1 - learning_factor) * w1``,
+    the others keep their weight.
+    """
+
+    found, index = _find(keys2, keys1)
+
+    weights1 = weights1.copy()
+    weights1[found] = (
+        learning_factor * weights2[index[found]]
+        + (1 - learning_factor) * weights1[found]
+    )
+
+    # every edge of the second graph is set anew
+    new = ~_find(keys1, keys2)[0]
+    keys, weights = _merge(keys1, weights1, keys2[new], weights2[new])
+
+    return keys, weights, np.concatenate((weights1[found], weights2[new]))
+
+
+def intersection(keys1, weights1, keys2, weights2):
+    """The edges both graphs hold, weighing the mean of their weights."""
+
+    found, index = _find(keys2, keys1)
+    weights = (weights1[found] + weights2[index[found]]) / 2.0
+
+    return keys1[found], weights, weights
+
+
+def difference(keys1, weights1, keys2, weights2):
+    """The edges of the first graph the second does not hold."""
+
+    found, _ = _find(keys2, keys1)
+
+    return keys1[~found], weights1[~found], weights1[:0]
+
+
+def symmetric_difference(keys1, weights1, keys2, weights2):
+    """The edges of either graph the other does not hold."""
+
+    new = ~_find(keys1, keys2)[0]
+    keys, weights = _merge(
+        *difference(keys1, weights1, keys2, weights2)[:2], keys2[new], weights2[new]
+    )
+
+    return keys, weights, weights2[new]
+
+
+# whether every key of keys is found in the sorted haystack,
+# and its index there where it is
+def _find(haystack, keys):
+    if len(haystack) == 0:
+        return np.zeros(len(keys), bool), np.zeros(len(keys), np.intp)
+
+    index = np.searchsorted(haystack, keys)
+    index[index == len(haystack)] = 0
+
+    return haystack[index] == keys, index
+
+
+# merges two sorted, disjoint key arrays and their weights
+def _merge(keys1, weights1, keys2, weights2):
+    keys = np.concatenate((keys1, keys2))
+    weights = np.concatenate((weights1, weights2))
+
+    order = np.argsort(keys, kind="stable")
+    return keys[order], weights[order]
@@ -0,0 +1,247 @@
+"""
+  edge_store.py
+
+  A compact, integer keyed edge weight store for n-gram graphs.
+
+"""
+
+import logging
+
+import networkx as nx
+import numpy as np
+
+from pyinsect.structs.vocabulary import Vocabulary
+
+logger = logging.getLogger(__name__)
+
+
+class EdgeStore(object):
+    """Keeps the weighted edges of an n-gram graph over interned vertex ids.
+
+    Every edge is a single ``dict`` entry mapping the packed key
+    ``(source_id << id_bits) | target_id`` to its weight, instead of the
+    nested adjacency and attribute dicts of a `networkx` graph.
+    Undirected stores keep every edge once, in its canonical orientation
+    ``(min_id, max_id)``, so that lookups do not depend on the order of the
+    endpoints and iterating over the edges visits each of them once.
+    """
+
+    def __init__(self, vocabulary=None, directed=True):
+        self._vocabulary = Vocabulary() if vocabulary is None else vocabulary
+        self._directed = directed
+
+        self._bits = self._vocabulary.id_bits
+        self._mask = (1 << self._bits) - 1
+
+        self._weights = {}
+
+        # sorted keys and weights, see key_arrays
+        self._arrays = None
+
+    def __len__(self):
+        if self._dict is None:
+            return len(self._arrays[0])
+        return len(self._dict)
+
+    def __str__(self):
+        return "edges: {0}, directed: {1}, vocabulary: {2}".format(
+            len(self), self._directed, self._vocabulary
+        )
+
+    def __repr__(self):
+        return '<{0} "{1}">'.format(self.__class__.__name__, str(self))
+
+    def __deepcopy__(self, memo):
+        # vocabularies are append-only, so copies may keep sharing them
+        return self.copy()
+
+    # the dict of weights, built on first use from the key arrays
+    # a store was given (see set_key_arrays), so results of set
+    # operations that are only combined further never build it
+    @property
+    def _weights(self):
+        if self._dict is None:
+            keys, weights = self._arrays
+            self._dict = dict(zip(keys.tolist(), weights.tolist()))
+        return self._dict
+
+    @_weights.setter
+    def _weights(self, weights):
+        self._dict = weights
+
+    @property
+    def vocabulary(self):
+        return self._vocabulary
+
+    @property
+    def directed(self):
+        return self._directed
+
+    @property
+    def weights(self):
+        """The (read only) mapping of packed edge keys to weights."""
+
+        return self._weights
+
+    def key(self, u, v):
+        """Packs the vertex ids `u` and `v` into a single (canonical) edge key."""
+
+        if not self._directed and v < u:
+            u, v = v, u
+
+        return (u << self._bits) | v
+
+    def split(self, key):
+        """Unpacks an edge key back to its `(u, v)` vertex ids."""
+
+        return key >> self._bits, key & self._mask
+
+    def has(self, u, v):
+        return self.key(u, v) in self._weights
+
+    def get(self, u, v, default=None):
+        return self._weights.get(self.key(u, v), default)
+
+    def set(self, u, v, w):
+        self._weights[self.key(u, v)] = w
+        self._arrays = None
+
+    def set_many(self, sources, targets, weights):
+        """Sets the weights of the edges `sources[i] -> targets[i]`."""
+
+        if self._bits <= 32:
+            sources = np.asarray(sources, np.uint64)
+            targets = np.asarray(targets, np.uint64)
+
+            if not self._directed:
+                sources, targets = (
+                    np.minimum(sources, targets),
+                    np.maximum(sources, targets),
+                )
+
+            keys = (sources << np.uint64(self._bits)) | targets
+
+            self._weights.update(zip(keys.tolist(), weights))
+            self._arrays = None
+            return
+
+        # wider ids do not pack in 64 bits, go through python ints
+        for u, v, w in zip(
+            np.asarray(sources).tolist(), np.asarray(targets).tolist(), weights
+        ):
+            self.set(u, v, w)
+
+    def remove(self, u, v):
+        del self._weights[self.key(u, v)]
+        self._arrays = None
+
+    def clear(self):
+        self._weights = {}
+        self._arrays = None
+
+    def copy(self):
+        other = self.__class__(self._vocabulary, directed=self._directed)
+        if self._dict is None:
+            # (the arrays are never modified)
+            other._weights, other._arrays = None, self._arrays
+        else:
+            other._weights = dict(self._dict)
+
+        return other
+
+    def items(self):
+        """Yields every edge once, as `(u, v, weight)` over vertex ids.
+
+        Undirected edges are given in their canonical orientation, ``u <= v``.
+        """
+
+        bits, mask = self._bits, self._mask
+
+        for key, w in self._weights.items():
+            yield key >> bits, key & mask, w
+
+    def edges(self):
+        """Yields every edge once, as `(ngram_u, ngram_v, weight)`."""
+
+        ngram = self._vocabulary.ngram
+
+        for u, v, w in self.items():
+            yield ngram(u), ngram(v), w
+
+    def nodes(self):
+        nodes = set()
+
+        for u, v, _ in self.items():
+            nodes.add(u)
+            nodes.add(v)
+
+        return nodes
+
+    def number_of_nodes(self):
+        if self._bits <= 32:
+            keys, _ = self.key_arrays()
+            return len(np.union1d(keys >> np.uint64(self._bits), keys & self._mask))
+
+        return len(self.nodes())
+
+    def key_arrays(self):
+        """Returns the packed edge keys, sorted, and their weights as arrays.
+
+        Only for ids of up to 32 bits, whose keys fit in 64.  The arrays are
+        kept until the store changes, so they are built once for any number
+        of lookups (see `SimilarityVS`); they must not be modified.
+        """
+
+        if self._bits > 32:
+            raise ValueError(
+                "Keys of {0} bit ids do not fit in 64 bits".format(self._bits)
+            )
+
+        if self._arrays is None:
+            keys = np.fromiter(self._weights.keys(), np.uint64, len(self))
+            weights = np.fromiter(self._weights.values(), np.float64, len(self))
+
+            order = np.argsort(keys)
+            self._arrays = keys[order], weights[order]
+
+        return self._arrays
+
+    def set_weights(self, weights):
+        """Replaces the edges with the `weights` dict of packed keys, which the
+        store takes over (see `weights`)."""
+
+        self._weights = weights
+        self._arrays = None
+
+    def set_key_arrays(self, keys, weights):
+        """Replaces the edges with those of the sorted, unique packed `keys`.
+
+        The inverse of `key_arrays`, which gives back the arrays (so they
+        must not be modified afterwards); see `edge_algebra`.  The dict of
+        `weights` is only built when first needed.
+        """
+
+        self._weights = None
+        self._arrays = keys, weights
+
+    def to_arrays(self):
+        """Returns the `(sources, targets, weights)` arrays, sorted by edge."""
+
+        edges = sorted(self.items())
+
+        sources = np.fromiter((u for u, _, _ in edges), np.int64, len(edges))
+        targets = np.fromiter((v for _, v, _ in edges), np.int64, len(edges))
+        weights = np.fromiter((w for _, _, w in edges), np.float64, len(edges))
+
+        return sources, targets, weights
+
+    def to_networkx(self):
+        """Builds the equivalent `networkx` graph, labelled by n-grams."""
+
+        graph = nx.DiGraph() if self._directed else nx.Graph()
+
+        graph.add_edges_from(
+            (u, v, {"key": "edge", "weight": w}) for u, v, w in self.edges()
+        )
+
+        return graph
@@ -0,0 +1,51 @@
+"""
+  grouping.py
+
+  Grouping of the long integer key arrays n-gram graphs are built from.
+
+"""
+
+import numpy as np
+
+
+def group_keys(keys, size=None):
+    """Groups equal integer keys, like ``np.unique`` does.
+
+    Returns `(unique, first, inverse)`: the distinct keys in increasing
+    order, the first position of each and the index of every key within
+    `unique`.  Unlike ``np.unique`` this needs no stable sort, which makes
+    it about twice as fast on the long key arrays of graph building; if
+    all keys are known to lie in ``[0, size)`` and that range is not much
+    larger than `keys`, they are grouped in a dense table without sorting.
+    """
+
+    if len(keys) == 0:
+        empty = np.empty(0, np.int64)
+        return keys[:0], empty, empty
+
+    if size is not None and size <= 2 * len(keys) + (1 << 16):
+        positions = np.arange(len(keys))
+
+        first = np.full(size, len(keys), np.int64)
+        np.minimum.at(first, keys, positions)
+
+        unique = np.flatnonzero(first < len(keys))
+
+        index = np.empty(size, np.int64)
+        index[unique] = np.arange(len(unique))
+
+        return unique.astype(keys.dtype), first[unique], index[keys]
+
+    order = np.argsort(keys)
+    ordered = keys[order]
+
+    starts = np.empty(len(keys), bool)
+    starts[0] = True
+    np.not_equal(ordered[1:], ordered[:-1], out=starts[1:])
+
+    groups = np.flatnonzero(starts)
+
+    inverse = np.empty(len(keys), np.int64)
+    inverse[order] = np.cumsum(starts) - 1
+
+    return ordered[groups], np.minimum.reduceat(order, groups), inverse
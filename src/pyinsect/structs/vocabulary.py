@@ -0,0 +1,444 @@
+"""
+  vocabulary.py
+
+  Maps the n-grams of one or more graphs to integer vertex ids.
+
+"""
+
+import hashlib
+import logging
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from pyinsect.structs.grouping import group_keys
+
+logger = logging.getLogger(__name__)
+
+
+class Vocabulary(object):
+    """Interns n-grams to consecutive integer ids.
+
+    A vocabulary is append-only: once an n-gram has been given an id the
+    mapping never changes, so any number of graphs may safely share one
+    vocabulary and compare their vertices as plain integers.
+    """
+
+    # number of bits an id is guaranteed to fit in
+    id_bits = 32
+
+    def __init__(self):
+        self._ids = {}
+        self._ngrams = []
+
+    def __len__(self):
+        return len(self._ngrams)
+
+    def __contains__(self, ngram):
+        return ngram in self._ids
+
+    def __str__(self):
+        return "size: {0}".format(len(self))
+
+    def __repr__(self):
+        return '<{0} "{1}">'.format(self.__class__.__name__, str(self))
+
+    def intern(self, ngram):
+        """Returns the id of `ngram`, assigning the next free one if it is new."""
+
+        try:
+            return self._ids[ngram]
+        except KeyError:
+            index = len(self._ngrams)
+
+            if index >> self.id_bits:
+                raise OverflowError(
+                    "Vocabulary exceeded {0} bit ids".format(self.id_bits)
+                )
+
+            self._ids[ngram] = index
+            self._ngrams.append(ngram)
+
+            return index
+
+    def index(self, ngram):
+        """Returns the id of a known `ngram`, raising `KeyError` otherwise."""
+
+        return self._ids[ngram]
+
+    def get(self, ngram, default=None):
+        return self._ids.get(ngram, default)
+
+    def ngram(self, index):
+        """Returns the n-gram behind vertex id `index`."""
+
+        return self._ngrams[index]
+
+    def compatible_with(self, other):
+        """Whether ids issued by `other` denote the same n-grams as ours."""
+
+        return self is other
+
+    def spawn(self):
+        """Returns an empty vocabulary of the same kind and settings."""
+
+        return self.__class__()
+
+    def update(self, other):
+        """Adds the n-grams known to `other`."""
+
+        for ngram in other._ngrams:
+            self.intern(ngram)
+
+
+class RollingHashVocabulary(Vocabulary):
+    """Identifies every n-gram by a 64-bit Rabin-Karp hash of its symbols.
+
+    No interning table is needed: the id of an n-gram is a function of the
+    n-gram alone, so graphs built independently (even in other processes)
+    with vocabularies of the same `base` share their vertex ids.
+
+    Characters hash by code point and integers by value, while any other
+    symbol (e.g. a word) hashes through a stable digest of its text.
+
+    With `keep_ngrams` a reverse table from hash to n-gram is kept, so that
+    graphs can still be labelled by n-grams.  `audit` (which implies
+    `keep_ngrams`) additionally checks every n-gram against the table and
+    records colliding pairs in `collisions`.
+    """
+
+    id_bits = 64
+
+    _mask = (1 << 64) - 1
+
+    def __init__(self, base=0x100000001B3, keep_ngrams=True, audit=False):
+        super().__init__()
+
+        self._base = base | 1
+        self._keep_ngrams = keep_ngrams or audit
+        self._audit = audit
+
+        # the reverse table, hash to n-gram
+        self._table = {}
+
+        self.collisions = []
+
+    def __len__(self):
+        return len(self._table)
+
+    def __contains__(self, ngram):
+        if self._keep_ngrams:
+            return self.hash(ngram) in self._table
+        return True
+
+    @property
+    def base(self):
+        return self._base
+
+    @property
+    def keep_ngrams(self):
+        return self._keep_ngrams
+
+    @classmethod
+    def symbol_code(cls, symbol):
+        """Returns the (process independent) integer a symbol hashes as."""
+
+        if isinstance(symbol, str) and len(symbol) == 1:
+            return ord(symbol)
+
+        if isinstance(symbol, (int, np.integer)):
+            return int(symbol) & cls._mask
+
+        digest = hashlib.blake2b(str(symbol).encode("utf-8"), digest_size=8)
+        return int.from_bytes(digest.digest(), "little")
+
+    def hash(self, ngram):
+        """Hashes a sequence of symbols."""
+
+        h = 0
+        for symbol in ngram:
+            h = (h * self._base + self.symbol_code(symbol) + 1) & self._mask
+        return h
+
+    def roll(self, h, outgoing, incoming, n):
+        """Slides the hash `h` of an n-gram one symbol forward in O(1)."""
+
+        h -= (self.symbol_code(outgoing) + 1) * pow(self._base, n - 1, 1 << 64)
+        return (h * self._base + self.symbol_code(incoming) + 1) & self._mask
+
+    def hash_windows(self, codes, decode, n):
+        """Hashes the n-gram starting at every position of encoded data.
+
+        `codes` and `decode` are as returned by `encode_symbols`; the hashes
+        are evaluated for all positions at once, one symbol column at a time.
+        """
+
+        if n < 1 or len(codes) < n:
+            return np.empty(0, np.uint64)
+
+        # codes of the distinct symbols, as hashed by symbol_code
+        symbols, inverse = np.unique(codes, return_inverse=True)
+        table = np.array(
+            [self.symbol_code(decode(code)) for code in symbols.tolist()], np.uint64
+        )
+        values = table[inverse.reshape(-1)] + np.uint64(1)
+
+        windows = sliding_window_view(values, n)
+
+        hashes = np.zeros(len(windows), np.uint64)
+        base = np.uint64(self._base)
+        for column in range(n):
+            hashes = hashes * base + windows[:, column]
+
+        return hashes
+
+    def intern_windows(self, codes, decode, n):
+        """Interns the n-gram starting at every position of encoded data.
+
+        Returns `(ids, vertices)`, a dense id per position and the vertex id
+        (hash) behind every dense id.
+        """
+
+        hashes = self.hash_windows(codes, decode, n)
+        vertices, first, ids = np.unique(hashes, return_index=True, return_inverse=True)
+        ids = ids.reshape(-1)
+
+        if self._keep_ngrams:
+            windows = sliding_window_view(codes, n) if len(hashes) else None
+
+            positions = first
+            if self._audit:
+                # every position whose n-gram differs from the first
+                # one with the same hash is a collision
+                clashes = np.any(windows != windows[first][ids], axis=1)
+                positions = np.concatenate((first, np.flatnonzero(clashes)))
+
+            for position in positions.tolist():
+                self.remember(
+                    hashes[position].item(), tuple(map(decode, windows[position]))
+                )
+
+        return ids, vertices
+
+    def intern(self, ngram):
+        index = self.hash(ngram)
+
+        if self._keep_ngrams:
+            self.remember(index, ngram)
+
+        return index
+
+    def remember(self, index, ngram):
+        """Records `ngram` as the n-gram behind hash `index`."""
+
+        known = self._table.setdefault(index, ngram)
+
+        if self._audit and known != ngram:
+            logger.warning("Hash collision of %r and %r on %d", known, ngram, index)
+            self.collisions.append((index, known, ngram))
+
+    def index(self, ngram):
+        index = self.hash(ngram)
+
+        if self._keep_ngrams and index not in self._table:
+            raise KeyError(ngram)
+
+        return index
+
+    def get(self, ngram, default=None):
+        index = self.hash(ngram)
+
+        if self._keep_ngrams and index not in self._table:
+            return default
+
+        return index
+
+    def ngram(self, index):
+        """Returns the n-gram behind `index`, or `index` itself without a table."""
+
+        if self._keep_ngrams:
+            return self._table[index]
+        return index
+
+    def compatible_with(self, other):
+        return isinstance(other, RollingHashVocabulary) and other.base == self._base
+
+    def spawn(self):
+        return self.__class__(self._base, self._keep_ngrams, self._audit)
+
+    def update(self, other):
+        if self._keep_ngrams:
+            for index, ngram in other._table.items():
+                self.remember(index, ngram)
+
+
+class AlphabetVocabulary(Vocabulary):
+    """Packs the n-grams of a small, fixed alphabet into their ids.
+
+    Every symbol takes the fewest bits that number the alphabet (2 bits for
+    DNA's "ACGT") and the id of an n-gram is its symbols' bits behind a
+    leading 1 bit, so ids are computed by shifts alone and n-grams of
+    different lengths never share one.  No table is kept; like a
+    `RollingHashVocabulary`, vocabularies over the same alphabet share ids.
+    """
+
+    def __init__(self, alphabet="ACGT", id_bits=32):
+        super().__init__()
+
+        self._alphabet = tuple(alphabet)
+        self._codes = {symbol: code for code, symbol in enumerate(self._alphabet)}
+
+        if len(self._codes) != len(self._alphabet):
+            raise ValueError("Repeated symbols in alphabet {0!r}".format(alphabet))
+
+        self._bits = max((len(self._alphabet) - 1).bit_length(), 1)
+        self._dtype = np.min_scalar_type(len(self._alphabet) - 1)
+        self.id_bits = id_bits
+
+    def __len__(self):
+        return len(self._alphabet)
+
+    def __contains__(self, ngram):
+        return all(symbol in self._codes for symbol in ngram)
+
+    def __str__(self):
+        return "alphabet: {0}, bits: {1}".format(
+            "".join(map(str, self._alphabet)), self._bits
+        )
+
+    @property
+    def alphabet(self):
+        return self._alphabet
+
+    @property
+    def bits(self):
+        """The number of bits every symbol is packed in."""
+
+        return self._bits
+
+    def intern(self, ngram):
+        index = 1
+
+        for symbol in ngram:
+            try:
+                code = self._codes[symbol]
+            except KeyError:
+                raise ValueError(
+                    "Symbol {0!r} is not in the alphabet".format(symbol)
+                ) from None
+
+            index = (index << self._bits) | code
+
+        if index >> self.id_bits:
+            raise OverflowError(
+                "{0}-grams exceed {1} bit ids".format(len(ngram), self.id_bits)
+            )
+
+        return index
+
+    def index(self, ngram):
+        if ngram not in self:
+            raise KeyError(ngram)
+
+        return self.intern(ngram)
+
+    def get(self, ngram, default=None):
+        if ngram not in self:
+            return default
+
+        return self.intern(ngram)
+
+    def ngram(self, index):
+        n = (index.bit_length() - 1) // self._bits
+        mask = (1 << self._bits) - 1
+
+        return tuple(
+            self._alphabet[(index >> (self._bits * shift)) & mask]
+            for shift in range(n - 1, -1, -1)
+        )
+
+    def compatible_with(self, other):
+        return (
+            isinstance(other, AlphabetVocabulary)
+            and other.alphabet == self._alphabet
+            and other.id_bits == self.id_bits
+        )
+
+    def spawn(self):
+        return self.__class__(self._alphabet, self.id_bits)
+
+    def update(self, other):
+        pass
+
+    def pack_windows(self, codes, decode, n):
+        """Packs the n-gram starting at every position of encoded data.
+
+        `codes` and `decode` are as returned by `encode_symbols`; the ids
+        are built for all positions at once, one symbol column at a time.
+        """
+
+        if n < 1 or len(codes) < n:
+            return np.empty(0, np.int64)
+
+        if n * self._bits >= self.id_bits:
+            raise OverflowError("{0}-grams exceed {1} bit ids".format(n, self.id_bits))
+
+        values = self._symbol_indices(codes, decode)
+
+        dtype = np.int64 if n * self._bits < 63 else np.uint64
+        shift = dtype(self._bits)
+
+        count = len(codes) - n + 1
+        ids = np.ones(count, dtype)
+        for column in range(n):
+            ids = (ids << shift) | values[column : column + count].astype(dtype)
+
+        return ids
+
+    def intern_windows(self, codes, decode, n):
+        """Packs the n-gram starting at every position of encoded data.
+
+        Returns `(ids, vertices)`, a dense id per position and the vertex id
+        behind every dense id.
+        """
+
+        packed = self.pack_windows(codes, decode, n)
+
+        if not len(packed):
+            return np.empty(0, np.int64), packed
+
+        # drop the leading bit, so that the keys lie in [0, 2 ** (n * bits))
+        size = 1 << (n * self._bits)
+        vertices, _, ids = group_keys(packed - packed.dtype.type(size), size)
+
+        return ids, vertices + vertices.dtype.type(size)
+
+    # the index of every symbol of encoded data within the alphabet
+    def _symbol_indices(self, codes, decode):
+        if codes.dtype.kind == "u" or (len(codes) and codes.min() >= 0):
+            top = int(codes.max()) + 1 if len(codes) else 0
+        else:
+            top = None
+
+        if top is not None and top <= 2 * len(codes) + (1 << 16):
+            # small codes (characters, bytes): a lookup table by code
+            present = np.flatnonzero(np.bincount(codes, minlength=top))
+            table = np.zeros(top, self._dtype)
+            table[present] = [self._symbol_index(decode(c)) for c in present.tolist()]
+
+            return table[codes]
+
+        symbols, inverse = np.unique(codes, return_inverse=True)
+        table = np.array(
+            [self._symbol_index(decode(code)) for code in symbols.tolist()], self._dtype
+        )
+
+        return table[inverse.reshape(-1)]
+
+    def _symbol_index(self, symbol):
+        try:
+            return self._codes[symbol]
+        except KeyError:
+            raise ValueError(
+                "Symbol {0!r} is not in the alphabet".format(symbol)
+            ) from None
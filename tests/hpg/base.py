@@ -1,3 +1,4 @@
+import concurrent.futures
 import itertools
 import logging
 import random
@@ -117,6 +118,33 @@ class HPGTestCaseMixin(object):
 
                 self.assertTrue(0.0 <= value <= 1.0)
 
+    def test_bounded_and_concurrent_levels(self):
+        data1 = self.generate_random_2d_int_array(5)
+        data2 = self.generate_random_2d_int_array(5)
+
+        graph1 = self._construct_graph(data1, 3, 3, self.array_graph_metric)
+        graph2 = self._construct_graph(data2, 3, 3, self.array_graph_metric)
+
+        value = self.hpg_metric(graph1, graph2)
+
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            for metric in (
+                self.hpg_metric,
+                SimilarityHPG(self.array_graph_metric, executor),
+            ):
+                with self.subTest(metric=metric):
+                    self.assertEqual(metric(graph1, graph2), value)
+
+                    for threshold in (0.0, value, 0.5, 1.0):
+                        self.assertEqual(
+                            metric.similarity_at_least(graph1, graph2, threshold),
+                            value if value >= threshold else None,
+                        )
+                        self.assertEqual(
+                            metric.is_at_least(graph1, graph2, threshold),
+                            value >= threshold,
+                        )
+
     @classmethod
     def generate_random_2d_int_array(cls, size):
         return [
@@ -0,0 +1,105 @@
+from pyinsect.documentModel.representations import (
+    DocumentNGramGaussNormGraph,
+    DocumentNGramSymWinGraph,
+    build_graph,
+    build_graphs,
+)
+from pyinsect.documentModel.representations.DocumentNGramGraph import DocumentNGramGraph
+from pyinsect.structs.vocabulary import RollingHashVocabulary
+from tests.base import BaseParallelTestCase, BaseTestCase
+
+
+def _edges(graph):
+    if graph._directed:
+        return sorted(graph.weighted_edges())
+    return sorted((min(a, b), max(a, b), w) for a, b, w in graph.weighted_edges())
+
+
+class BuildGraphsTestCase(BaseTestCase):
+    documents = ["abcdefabcdef", "", "ab", "the quick brown fox", "fox the quick"]
+
+    def test_in_process(self):
+        for graph_class in (
+            DocumentNGramGraph,
+            DocumentNGramSymWinGraph,
+            DocumentNGramGaussNormGraph,
+        ):
+            graphs = list(build_graphs(self.documents, 3, 4, graph_class, workers=0))
+
+            self.assertEqual(len(graphs), len(self.documents))
+
+            for document, graph in zip(self.documents, graphs):
+                self.assertEqual(_edges(graph), _edges(graph_class(3, 4, document)))
+
+            self.assertTrue(graphs[0].shares_vocabulary(graphs[-1]))
+
+
+class ParallelBuildGraphsTestCase(BaseParallelTestCase):
+    documents = BuildGraphsTestCase.documents * 3
+
+    def test_pool(self):
+        for graph_class in (DocumentNGramGraph, DocumentNGramGaussNormGraph):
+            graphs = build_graphs(
+                iter(self.documents),
+                3,
+                4,
+                graph_class,
+                pool=self.pool,
+                chunksize=2,
+                max_pending=2,
+            )
+
+            for document, graph in zip(self.documents, graphs):
+                self.assertEqual(_edges(graph), _edges(graph_class(3, 4, document)))
+
+    def test_rolling_hash_vocabulary(self):
+        vocabulary = RollingHashVocabulary()
+
+        graphs = list(
+            build_graphs(self.documents, 3, 2, pool=self.pool, vocabulary=vocabulary)
+        )
+
+        self.assertEqual(
+            _edges(graphs[0]), _edges(DocumentNGramGraph(3, 2, self.documents[0]))
+        )
+        self.assertIs(graphs[-1].getEdgeStore().vocabulary, vocabulary)
+
+
+class ParallelBuildGraphTestCase(BaseParallelTestCase):
+    document = "the quick brown fox jumps over the lazy dog, " * 4
+
+    def test_same_as_serial(self):
+        for graph_class in (
+            DocumentNGramGraph,
+            DocumentNGramSymWinGraph,
+            DocumentNGramGaussNormGraph,
+        ):
+            for segments in (1, 2, 7):
+                with self.subTest(graph_class=graph_class, segments=segments):
+                    expected = graph_class(3, 4, self.document)
+                    graph = build_graph(
+                        self.document, 3, 4, graph_class, segments, pool=self.pool
+                    )
+
+                    # the same edges, in the same order, with equal weights
+                    self.assertEqual(
+                        list(expected.getGraph().edges(data=True)),
+                        list(graph.getGraph().edges(data=True)),
+                    )
+                    self.assertEqual(expected.minW(), graph.minW())
+
+    def test_rolling_hash_vocabulary(self):
+        vocabulary = RollingHashVocabulary()
+
+        graph = build_graph(
+            self.document.split(),
+            2,
+            3,
+            segments=3,
+            pool=self.pool,
+            vocabulary=vocabulary,
+        )
+
+        self.assertEqual(
+            _edges(graph), _edges(DocumentNGramGraph(2, 3, self.document.split()))
+        )
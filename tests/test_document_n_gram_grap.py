@@ -1,5 +1,27 @@
-from pyinsect.documentModel.comparators import SimilarityNVS, Union
+import os
+import sys
+import tempfile
+import warnings
+
+from pyinsect.documentModel.comparators import (
+    Intersect,
+    LtoRNary,
+    ParallelNary,
+    SimilarityNVS,
+    SimilarityVS,
+    Union,
+    Update,
+    delta,
+    intersect_many,
+    inverse_intersection,
+    merge_many,
+)
+from pyinsect.documentModel.representations import (
+    DocumentNGramGaussNormGraph,
+    DocumentNGramSymWinGraph,
+)
 from pyinsect.documentModel.representations.DocumentNGramGraph import DocumentNGramGraph
+from pyinsect.structs.vocabulary import RollingHashVocabulary, Vocabulary
 from tests.base import BaseTestCase
 
 
@@ -23,11 +45,412 @@ class DocumentNGramGraphTestCase(BaseTestCase):
         self.assertAlmostEqual(self.gs.getSimilarityFromComponents(sc), 0.83, 2)
 
         self.assertAlmostEqual(self.gs(self.ngg1, self.ngg2), 0.83, 2)
+        self.assertEqual(sc["NVS"], self.gs(self.ngg1, self.ngg2))
+
+    def test_similarity_of_compact_graphs(self):
+        vocabulary = Vocabulary()
+
+        for graph_type in (DocumentNGramGraph, DocumentNGramSymWinGraph):
+            with self.subTest(graph_type=graph_type):
+                graph1 = graph_type(3, 4, "abcdefabcxyz")
+                graph2 = graph_type(3, 4, "abcdeffabcxy")
+
+                compact1 = graph_type(3, 4, "abcdefabcxyz", vocabulary=vocabulary)
+                compact2 = graph_type(3, 4, "abcdeffabcxy", vocabulary=vocabulary)
+
+                expected = self.gs.getSimilarityComponents(graph1, graph2)
+                components = self.gs.getSimilarityComponents(compact1, compact2)
+
+                for name in ("SS", "VS", "NVS"):
+                    self.assertAlmostEqual(components[name], expected[name])
+
+    def test_similarity_at_least(self):
+        ngg3 = DocumentNGramGraph(3, 2, "uvwxyzabc")
+        compact3 = DocumentNGramGraph(3, 2, "uvwxyzabc", compact=True)
+
+        for metric in (self.gs, SimilarityVS()):
+            for other in (self.ngg2, ngg3, compact3):
+                similarity = metric(self.ngg1, other)
+
+                for threshold in (0.0, 0.5, similarity, 0.9, 1.0):
+                    with self.subTest(metric=metric, other=other, threshold=threshold):
+                        self.assertEqual(
+                            metric.similarity_at_least(self.ngg1, other, threshold),
+                            similarity if similarity >= threshold else None,
+                        )
 
     def test_union(self):
         self.bop.apply(self.ngg1, self.ngg2)
 
+    def test_similarity_of_symmetric_graphs(self):
+        graph1 = DocumentNGramSymWinGraph(3, 4, "abcdef")
+        graph2 = DocumentNGramSymWinGraph(3, 4)
+
+        # same edges, in the opposite orientation
+        for a, b, w in graph1.weighted_edges():
+            graph2.setEdge(b, a, w)
+
+        self.assertEqual(SimilarityVS()(graph1, graph2), 1.0)
+
     def test_equality(self):
         other = DocumentNGramGraph(3, 2, "abcdef")
 
         self.assertEqual(self.ngg1, other)
+
+        # same shape, other labels
+        self.assertNotEqual(self.ngg1, DocumentNGramGraph(3, 2, "uvwxyz"))
+
+    def test_fingerprint(self):
+        other = DocumentNGramGraph(3, 2, "abcdef", compact=True)
+
+        self.assertEqual(self.ngg1.fingerprint(), other.fingerprint())
+        self.assertNotEqual(self.ngg1.fingerprint(), self.ngg2.fingerprint())
+
+        # kept up to date on edits
+        other.setEdge(("d", "e", "f"), ("f", "f", "f"), 2)
+        other.delEdge(("d", "e", "f"), ("f", "f", "f"))
+        self.assertEqual(self.ngg1.fingerprint(), other.fingerprint())
+
+        other.setEdge(("a", "b", "c"), ("b", "c", "d"), 2)
+        self.assertNotEqual(self.ngg1.fingerprint(), other.fingerprint())
+        self.assertNotEqual(self.ngg1, other)
+
+    def test_clone(self):
+        for compact in (False, True):
+            with self.subTest(compact=compact):
+                graph = DocumentNGramGraph(3, 2, "abcdef", compact=compact)
+                expected = DocumentNGramGraph(3, 2, "abcdef")
+
+                clone = graph.clone()
+                self.assertEqual(clone, graph)
+
+                # writes to either leave the other as it was
+                clone.setEdge(("a", "b", "c"), ("x", "y", "z"), 2)
+                self.assertEqual(graph, expected)
+                self.assertEqual(
+                    clone.getEdgeWeight(("a", "b", "c"), ("x", "y", "z")), 2
+                )
+
+                other = graph.clone()
+                graph.delEdge(("b", "c", "d"), ("a", "b", "c"))
+                self.assertEqual(other, expected)
+                self.assertNotEqual(graph, expected)
+
+                other.clear()
+                self.assertEqual(len(other), 0)
+                self.assertEqual(len(clone), len(expected) + 1)
+
+                # operators copy their first argument the same way
+                union = Union(lf=0.5)(expected, clone)
+                self.assertEqual(
+                    clone.getEdgeWeight(("c", "d", "e"), ("a", "b", "c")), 1
+                )
+                self.assertEqual(len(union), len(clone))
+
+    def test_update(self):
+        texts = ["abcdef", "abcdeff", "xyzabc", "abcdef"]
+
+        for compact in (False, True):
+            with self.subTest(compact=compact):
+                graphs = [DocumentNGramGraph(3, 2, t, compact=compact) for t in texts]
+
+                # the running average, the k-th graph weighing 1 / (k + 1)
+                expected = graphs[0].clone()
+                for k, graph in enumerate(graphs[1:], 1):
+                    expected = graph.clone().union(expected, k / (k + 1))
+
+                self.assertEqual(Update()(*graphs), expected)
+                self.assertEqual(Update()(*graphs), expected)
+                self.assertEqual(graphs[0], DocumentNGramGraph(3, 2, texts[0]))
+
+        # edges every graph holds get their weighted mean
+        graphs = [DocumentNGramGraph(2, 2, "abab" * i) for i in (1, 2, 3)]
+        merged = merge_many(graphs, weights=[1, 2, 3])
+        self.assertAlmostEqual(
+            merged.getEdgeWeight(("a", "b"), ("b", "a")),
+            sum(
+                weight * graph.getEdgeWeight(("a", "b"), ("b", "a"))
+                for weight, graph in zip([1, 2, 3], graphs)
+            )
+            / 6,
+        )
+
+        # as many graphs as the recursion limit allows calls
+        graphs = [self.ngg1] * 2 * sys.getrecursionlimit()
+        self.assertEqual(Update()(*graphs), self.ngg1)
+
+    def test_parallel_nary(self):
+        texts = ["abcdef", "abcdeff", "xyzabc", "abcxyz", "bcdefa", "fedcba", "ab"]
+        union = Union(lf=0.3, distributional=True)
+
+        vocabulary = Vocabulary()
+        compact = [DocumentNGramGraph(3, 2, t, vocabulary=vocabulary) for t in texts]
+        expected = ParallelNary(union, 1)(*compact)
+
+        for graphs in (compact, [DocumentNGramGraph(3, 2, t) for t in texts]):
+            # the same pairs, so the same weights, in any number of processes
+            for nthreads in (1, 2, 3):
+                with self.subTest(compact=graphs is compact, nthreads=nthreads):
+                    graph = ParallelNary(union, nthreads)(*graphs)
+
+                    self.assertEqual(graph, expected)
+                    self.assertEqual(graph.maxW(), expected.maxW())
+                    if graphs is compact:
+                        self.assertEqual(
+                            graph.key_arrays()[1].tolist(),
+                            expected.key_arrays()[1].tolist(),
+                        )
+
+            self.assertEqual(len(expected), len(LtoRNary(union)(*graphs)))
+            self.assertEqual(graphs[0], DocumentNGramGraph(3, 2, texts[0]))
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            ParallelNary(Intersect())
+        self.assertEqual(len(caught), 1)
+
+    def test_intersect_many(self):
+        texts = ["abcdefabc", "xabcdefab", "abcdeabcd"]
+
+        for compact in (False, True):
+            graphs = [DocumentNGramGraph(3, 2, t, compact=compact) for t in texts]
+            common = [(a, b) for a, b, _ in graphs[0].weighted_edges()]
+            common = [e for e in common if all(g.getEdgeWeight(*e) for g in graphs)]
+
+            for combine, function in (
+                ("mean", lambda w: sum(w) / len(w)),
+                ("min", min),
+            ):
+                with self.subTest(compact=compact, combine=combine):
+                    graph = intersect_many(graphs, combine)
+
+                    self.assertEqual(len(graph), len(common))
+                    for edge in common:
+                        self.assertAlmostEqual(
+                            graph.getEdgeWeight(*edge),
+                            function([g.getEdgeWeight(*edge) for g in graphs]),
+                        )
+                    self.assertEqual(graphs[0], DocumentNGramGraph(3, 2, texts[0]))
+
+            # nothing in common with a disjoint graph
+            disjoint = DocumentNGramGraph(3, 2, "uvwxyz", compact=compact)
+            self.assertEqual(len(intersect_many(graphs + [disjoint])), 0)
+
+        with self.assertRaises(ValueError):
+            intersect_many(graphs, "max")
+
+
+class CompactDocumentNGramGraphTestCase(BaseTestCase):
+    text = "Another, bigger test. But a test, anyway..."
+
+    def test_same_graph_as_networkx(self):
+        for graph_type in (DocumentNGramGraph, DocumentNGramSymWinGraph):
+            with self.subTest(graph_type=graph_type):
+                graph = graph_type(3, 3, self.text)
+                compact = graph_type(3, 3, self.text, compact=True)
+
+                self.assertEqual(len(graph), len(compact))
+                self.assertEqual(graph.number_of_edges(), compact.number_of_edges())
+                self.assertEqual(
+                    set(graph.getGraph().edges(data="weight")),
+                    set(compact.getGraph().edges(data="weight")),
+                )
+
+    def test_similarity(self):
+        graph1 = DocumentNGramGraph(3, 2, "abcdef", compact=True)
+        graph2 = DocumentNGramGraph(3, 2, "abcdeff", compact=True)
+
+        self.assertAlmostEqual(SimilarityNVS()(graph1, graph2), 0.83, 2)
+
+    def test_union(self):
+        graph1 = DocumentNGramGraph(3, 2, "abcdef", compact=True)
+        graph2 = DocumentNGramGraph(3, 2, "abcdeff", compact=True)
+        expected = DocumentNGramGraph(3, 2, "abcdef").union(
+            DocumentNGramGraph(3, 2, "abcdeff")
+        )
+
+        self.assertEqual(graph1.union(graph2).getGraph().size(), len(expected))
+        self.assertEqual(
+            graph1.getEdgeWeight(("c", "d", "e"), ("a", "b", "c")),
+            expected.getEdgeWeight(("c", "d", "e"), ("a", "b", "c")),
+        )
+
+    def test_operators_same_as_networkx(self):
+        texts = ("abcdefabcxyz", "abcdeffabcxy", "")
+
+        for graph_type in (DocumentNGramGraph, DocumentNGramSymWinGraph):
+            # sorted edge keys, and (64 bit ids) edge by edge
+            for vocabulary in (Vocabulary(), RollingHashVocabulary()):
+                for operator in (
+                    Union(lf=0.3),
+                    Intersect(),
+                    delta(),
+                    inverse_intersection(),
+                ):
+                    for text1 in texts:
+                        for text2 in texts:
+                            with self.subTest(
+                                graph_type=graph_type,
+                                vocabulary=vocabulary,
+                                operator=operator,
+                                texts=(text1, text2),
+                            ):
+                                compact1 = graph_type(
+                                    3, 2, text1, vocabulary=vocabulary
+                                )
+                                compact2 = graph_type(
+                                    3, 2, text2, vocabulary=vocabulary
+                                )
+
+                                expected = operator(
+                                    graph_type(3, 2, text1), graph_type(3, 2, text2)
+                                )
+                                graph = operator(compact1, compact2)
+
+                                self.assertEqual(graph, expected)
+                                self.assertEqual(graph.maxW(), expected.maxW())
+                                self.assertEqual(
+                                    graph.number_of_edges(), expected.number_of_edges()
+                                )
+
+                                # the arguments are left as they were
+                                self.assertEqual(compact1, graph_type(3, 2, text1))
+
+
+class VectorizedDocumentNGramGraphTestCase(BaseTestCase):
+    data = [
+        "GATTACATTAG",
+        "Another, bigger test. But a test, anyway...",
+        ["the", "cat", "sat", "on", "the", "mat", "the", "cat"],
+        [1, 2, 3, 1, 2, 3, 3, 1],
+    ]
+
+    def test_same_graph_as_window_scan(self):
+        for graph_type in (
+            DocumentNGramGraph,
+            DocumentNGramSymWinGraph,
+            DocumentNGramGaussNormGraph,
+        ):
+            for data in self.data:
+                for n, window_size in [(1, 2), (3, 2), (3, 4), (5, 3)]:
+                    with self.subTest(
+                        graph_type=graph_type, data=data, n=n, window_size=window_size
+                    ):
+                        expected = graph_type(n, window_size, data, vectorized=False)
+                        graph = graph_type(n, window_size, data)
+
+                        self.assertEqual(
+                            list(expected.getGraph().edges(data=True)),
+                            list(graph.getGraph().edges(data=True)),
+                        )
+                        self.assertEqual(expected.maxW(), graph.maxW())
+                        self.assertEqual(expected.minW(), graph.minW())
+
+    def test_getngram(self):
+        graph = DocumentNGramGraph(3, 2, "abcde")
+
+        self.assertEqual(
+            graph.getngram(), [["a", "b", "c"], ["b", "c", "d"], ["c", "d", "e"]]
+        )
+
+    def test_build_from_chunks(self):
+        for graph_type in (
+            DocumentNGramGraph,
+            DocumentNGramSymWinGraph,
+            DocumentNGramGaussNormGraph,
+        ):
+            for data in self.data:
+                for size in (1, 2, 5):
+                    with self.subTest(graph_type=graph_type, data=data, size=size):
+                        expected = graph_type(3, 4, data, vectorized=False)
+
+                        graph = graph_type(3, 4)
+                        graph.build_from_chunks(
+                            data[i : i + size] for i in range(0, len(data), size)
+                        )
+
+                        self.assertEqual(
+                            list(expected.getGraph().edges(data=True)),
+                            list(graph.getGraph().edges(data=True)),
+                        )
+                        self.assertEqual(expected.maxW(), graph.maxW())
+
+    def test_max_edges(self):
+        data = "abcabcabdabdaaaabbbb" * 5
+        expected = {
+            (a, b): w for a, b, w in DocumentNGramGraph(2, 3, data).weighted_edges()
+        }
+        total = sum(expected.values())
+
+        graph = DocumentNGramGraph(2, 3, data, max_edges=5)
+        streamed = DocumentNGramGraph(2, 3, max_edges=5)
+        streamed.build_from_chunks(data[i : i + 7] for i in range(0, len(data), 7))
+
+        for capped in (graph, streamed):
+            with self.subTest(streamed=capped is streamed):
+                weights = {(a, b): w for a, b, w in capped.weighted_edges()}
+                error = capped.weight_error()
+
+                self.assertLessEqual(len(weights), 5)
+                self.assertGreater(error, 0)
+                self.assertLessEqual(error, total / 6)
+
+                for edge, weight in expected.items():
+                    self.assertLessEqual(weights.get(edge, 0), weight)
+                    self.assertLessEqual(weight, weights.get(edge, 0) + error)
+
+        # a single pass keeps the heaviest edges, with their weights
+        heaviest = sorted(expected.items(), key=lambda item: -item[1])[:5]
+        self.assertEqual(
+            set(graph.weighted_edges()), {(a, b, w) for (a, b), w in heaviest}
+        )
+
+
+class FileDocumentNGramGraphTestCase(BaseTestCase):
+    text = "Ελληνικά and English, mixed: ünïcödé text. " * 3
+
+    def setUp(self):
+        super().setUp()
+
+        with tempfile.NamedTemporaryFile(delete=False) as file:
+            file.write(self.text.encode("utf-8"))
+
+        self.path = file.name
+        self.size = os.path.getsize(self.path)
+
+    def tearDown(self):
+        os.unlink(self.path)
+
+        super().tearDown()
+
+    def test_same_graph_as_data(self):
+        for mode, data in [("bytes", self.text.encode("utf-8")), ("text", self.text)]:
+            with self.subTest(mode=mode):
+                expected = DocumentNGramGraph(3, 2, data)
+                graph = DocumentNGramGraph.from_file(self.path, 3, 2, mode=mode)
+
+                self.assertEqual(
+                    list(expected.getGraph().edges(data=True)),
+                    list(graph.getGraph().edges(data=True)),
+                )
+
+    def test_byte_ranges_add_up(self):
+        for graph_type in (DocumentNGramGraph, DocumentNGramSymWinGraph):
+            for mode in ("bytes", "text"):
+                with self.subTest(graph_type=graph_type, mode=mode):
+                    expected = graph_type.from_file(self.path, 3, 4, mode=mode)
+
+                    cuts = [0, 1, 7, self.size // 2, self.size - 3, self.size]
+                    graph = graph_type(3, 4)
+                    for start, stop in zip(cuts, cuts[1:]):
+                        graph.accumulate(
+                            graph_type.from_file(
+                                self.path, 3, 4, mode=mode, start=start, stop=stop
+                            )
+                        )
+
+                    for a, b, w in expected.weighted_edges():
+                        self.assertEqual(graph.getEdgeWeight(a, b), w)
+                    self.assertEqual(len(graph), len(expected))
+                    self.assertEqual(graph.minW(), expected.minW())
+                    self.assertEqual(graph.maxW(), expected.maxW())
@@ -0,0 +1,146 @@
+from pyinsect.documentModel.comparators import SimilarityNVS
+from pyinsect.documentModel.representations.DocumentNGramGraph import DocumentNGramGraph
+from pyinsect.documentModel.representations.DocumentNGramSymWinGraph import (
+    DocumentNGramSymWinGraph,
+)
+from pyinsect.structs.edge_store import EdgeStore
+from pyinsect.structs.vocabulary import (
+    AlphabetVocabulary,
+    RollingHashVocabulary,
+    Vocabulary,
+)
+from tests.base import BaseTestCase
+
+
+class EdgeStoreTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.vocabulary = Vocabulary()
+
+        self.a = self.vocabulary.intern(("a", "b"))
+        self.b = self.vocabulary.intern(("b", "c"))
+
+    def test_vocabulary_ids_are_stable(self):
+        self.assertEqual(self.vocabulary.intern(("a", "b")), self.a)
+        self.assertEqual(self.vocabulary.ngram(self.b), ("b", "c"))
+        self.assertEqual(len(self.vocabulary), 2)
+
+    def test_directed(self):
+        store = EdgeStore(self.vocabulary)
+        store.set(self.a, self.b, 2.0)
+
+        self.assertEqual(store.get(self.a, self.b), 2.0)
+        self.assertIsNone(store.get(self.b, self.a))
+        self.assertEqual(len(store), 1)
+
+        store.remove(self.a, self.b)
+
+        self.assertEqual(len(store), 0)
+
+    def test_undirected(self):
+        store = EdgeStore(self.vocabulary, directed=False)
+        store.set(self.a, self.b, 2.0)
+        store.set(self.b, self.a, 3.0)
+        store.set(self.a, self.a, 1.0)
+
+        self.assertEqual(store.get(self.a, self.b), 3.0)
+        self.assertEqual(len(store), 2)
+        # one entry per edge
+        self.assertEqual(len(store.weights), 2)
+        self.assertEqual(len(list(store.items())), 2)
+        self.assertEqual(store.to_networkx().number_of_edges(), 2)
+
+        store.remove(self.b, self.a)
+        store.remove(self.a, self.a)
+
+        self.assertEqual(len(store), 0)
+
+    def test_key_arrays(self):
+        store = EdgeStore(self.vocabulary)
+        store.set(self.b, self.a, 2.0)
+        store.set(self.a, self.b, 1.0)
+
+        keys, weights = store.key_arrays()
+
+        self.assertEqual(
+            keys.tolist(), [store.key(self.a, self.b), store.key(self.b, self.a)]
+        )
+        self.assertEqual(weights.tolist(), [1.0, 2.0])
+        self.assertEqual(store.number_of_nodes(), 2)
+
+        # rebuilt once the store changes
+        store.remove(self.a, self.b)
+
+        self.assertEqual(store.key_arrays()[1].tolist(), [2.0])
+
+
+class RollingHashVocabularyTestCase(BaseTestCase):
+    text = "Another, bigger test. But a test, anyway..."
+
+    def test_roll(self):
+        vocabulary = RollingHashVocabulary()
+
+        self.assertEqual(
+            vocabulary.roll(vocabulary.hash("abc"), "a", "d", 3), vocabulary.hash("bcd")
+        )
+
+    def test_same_graph_as_interned(self):
+        vocabulary = RollingHashVocabulary(audit=True)
+
+        for data in (self.text, self.text.split()):
+            with self.subTest(data=data):
+                expected = DocumentNGramGraph(3, 3, data)
+                graph = DocumentNGramGraph(3, 3, data, vocabulary=vocabulary)
+
+                self.assertEqual(
+                    set(expected.getGraph().edges(data="weight")),
+                    set(graph.getGraph().edges(data="weight")),
+                )
+
+        self.assertEqual(vocabulary.collisions, [])
+
+    def test_similarity_across_vocabularies(self):
+        graph1 = DocumentNGramGraph(
+            3, 2, "abcdef", vocabulary=RollingHashVocabulary(keep_ngrams=False)
+        )
+        graph2 = DocumentNGramGraph(
+            3, 2, "abcdeff", vocabulary=RollingHashVocabulary(keep_ngrams=False)
+        )
+
+        self.assertTrue(graph1.shares_vocabulary(graph2))
+        self.assertAlmostEqual(SimilarityNVS()(graph1, graph2), 0.83, 2)
+
+
+class AlphabetVocabularyTestCase(BaseTestCase):
+    sequence = "GATTACATTAGGATTACA"
+
+    def test_ids(self):
+        vocabulary = AlphabetVocabulary("ACGT")
+
+        self.assertEqual(vocabulary.bits, 2)
+        self.assertEqual(vocabulary.intern("GAT"), 0b1100011)
+        self.assertNotEqual(vocabulary.intern("A"), vocabulary.intern("AA"))
+        self.assertEqual(vocabulary.ngram(vocabulary.intern("GAT")), tuple("GAT"))
+        self.assertIsNone(vocabulary.get("GAN"))
+
+        with self.assertRaises(ValueError):
+            vocabulary.intern("GAN")
+
+        with self.assertRaises(OverflowError):
+            vocabulary.intern("A" * 16)
+
+    def test_same_graph_as_interned(self):
+        for graph_class in (DocumentNGramGraph, DocumentNGramSymWinGraph):
+            for data in (self.sequence, self.sequence.encode()):
+                with self.subTest(graph_class=graph_class, data=data):
+                    alphabet = "ACGT" if isinstance(data, str) else b"ACGT"
+                    expected = graph_class(4, 3, data)
+                    graph = graph_class(4, 3, data, alphabet=alphabet)
+
+                    self.assertTrue(graph.is_compact())
+                    self.assertEqual(graph, expected)
+
+    def test_unknown_symbol(self):
+        with self.assertRaises(ValueError):
+            DocumentNGramGraph(3, 2, "GATTACANNN", alphabet="ACGT")
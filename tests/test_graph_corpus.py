@@ -0,0 +1,79 @@
+from pyinsect.documentModel.comparators.NGramGraphSimilarity import (
+    SimilarityNVS,
+    SimilaritySS,
+    SimilarityVS,
+)
+from pyinsect.documentModel.representations import DocumentNGramSymWinGraph
+from pyinsect.documentModel.representations.DocumentNGramGraph import DocumentNGramGraph
+from pyinsect.indexing.graph_corpus import GraphCorpus
+from pyinsect.structs.vocabulary import Vocabulary
+from tests.base import BaseTestCase
+
+
+class GraphCorpusTestCase(BaseTestCase):
+    documents = [
+        "abcdefabcdef",
+        "",
+        "ab",
+        "the quick brown fox",
+        "fox the quick",
+        "the quick brown fox jumps over the lazy dog",
+    ]
+    queries = ["the quick fox", "abcabc", "", "zzzz"]
+    metrics = {"SS": SimilaritySS(), "VS": SimilarityVS(), "NVS": SimilarityNVS()}
+
+    def _assert_same_as_metrics(self, corpus, graphs, queries):
+        for query in queries:
+            for name, metric in self.metrics.items():
+                with self.subTest(query=str(query), metric=name):
+                    similarities = corpus.similarities(query, name)
+
+                    self.assertEqual(similarities.shape, (len(graphs),))
+                    for value, graph in zip(similarities, graphs):
+                        self.assertAlmostEqual(
+                            value, metric.getSimilarityDouble(query, graph)
+                        )
+
+    def test_compact_graphs(self):
+        for graph_class in (DocumentNGramGraph, DocumentNGramSymWinGraph):
+            vocabulary = Vocabulary()
+            graphs = [
+                graph_class(3, 3, document, vocabulary=vocabulary)
+                for document in self.documents
+            ]
+            queries = [
+                graph_class(3, 3, query, vocabulary=vocabulary)
+                for query in self.queries
+            ]
+
+            corpus = GraphCorpus(graphs)
+
+            self.assertEqual(len(corpus), len(graphs))
+            self.assertIs(corpus.vocabulary, vocabulary)
+            self._assert_same_as_metrics(corpus, graphs, queries)
+
+    def test_networkx_graphs(self):
+        for graph_class in (DocumentNGramGraph, DocumentNGramSymWinGraph):
+            graphs = [graph_class(3, 3, document) for document in self.documents]
+            queries = [graph_class(3, 3, query) for query in self.queries]
+
+            corpus = GraphCorpus()
+            for index, graph in enumerate(graphs):
+                self.assertEqual(corpus.add(graph), index)
+
+            self._assert_same_as_metrics(corpus, graphs, queries)
+
+    def test_metric_instances(self):
+        graphs = [DocumentNGramGraph(3, 3, document) for document in self.documents]
+        query = DocumentNGramGraph(3, 3, self.queries[0])
+
+        corpus = GraphCorpus(graphs)
+
+        for name, metric in self.metrics.items():
+            self.assertEqual(
+                corpus.similarities(query, metric).tolist(),
+                corpus.similarities(query, name).tolist(),
+            )
+
+        with self.assertRaises(ValueError):
+            corpus.similarities(query, "XS")
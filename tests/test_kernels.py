@@ -0,0 +1,46 @@
+import math
+
+from pyinsect.documentModel.representations import (
+    ConstantKernel,
+    DocumentNGramGaussNormGraph,
+    DocumentNGramSymWinGraph,
+    FunctionKernel,
+    GaussianKernel,
+    InverseKernel,
+    LinearKernel,
+)
+from tests.base import BaseTestCase
+
+
+class KernelTestCase(BaseTestCase):
+    def test_tables(self):
+        self.assertEqual(ConstantKernel().table(3).tolist(), [1, 1, 1])
+        self.assertEqual(LinearKernel(2).table(3).tolist(), [1.0, 0.5, 0.0])
+        self.assertEqual(InverseKernel(2).table(2).tolist(), [1.0, 0.25])
+        self.assertEqual(
+            FunctionKernel(lambda x: x / 3, digits=2).table(2).tolist(), [0.33, 0.67]
+        )
+
+    def test_gaussian_weights_of_gauss_norm_graph(self):
+        graph = DocumentNGramGaussNormGraph(3, 4)
+        graph.set_dsf(2, 0)
+
+        self.assertEqual(
+            GaussianKernel(2, digits=2).table(6).tolist(),
+            [float(format(graph.pdf(j), ".2f")) for j in range(1, 7)],
+        )
+
+    def test_graph_kernel(self):
+        graph = DocumentNGramSymWinGraph(1, 4, "abc", kernel=InverseKernel())
+
+        self.assertEqual(graph.getEdgeWeight(("a",), ("b",)), 1.0)
+        self.assertEqual(graph.getEdgeWeight(("a",), ("c",)), 0.5)
+
+        graph = DocumentNGramGaussNormGraph(1, 4, "abc", kernel=GaussianKernel(2))
+
+        self.assertTrue(
+            math.isclose(
+                graph.getEdgeWeight(("a",), ("c",)),
+                math.exp(-2 / 8) / (2 * math.sqrt(2 * math.pi)),
+            )
+        )
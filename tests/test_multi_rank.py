@@ -0,0 +1,51 @@
+from pyinsect.documentModel.comparators import SimilarityMultiRank, SimilarityNVS
+from pyinsect.documentModel.representations import (
+    DocumentNGramSymWinGraph,
+    MultiRankNGramGraph,
+)
+from pyinsect.documentModel.representations.DocumentNGramGraph import DocumentNGramGraph
+from tests.base import BaseTestCase
+
+
+class MultiRankNGramGraphTestCase(BaseTestCase):
+    text1 = "Another, bigger test. But a test, anyway..."
+    text2 = "A test, but a bigger one. Another test anyway."
+
+    def test_same_graphs_as_single_rank(self):
+        for graph_type in (DocumentNGramGraph, DocumentNGramSymWinGraph):
+            for data in (self.text1, self.text1.split(), "ab"):
+                with self.subTest(graph_type=graph_type, data=data):
+                    graph = MultiRankNGramGraph(
+                        (1, 2, 4), 3, data, graph_type=graph_type
+                    )
+
+                    self.assertEqual(graph.ranks, [1, 2, 4])
+
+                    for n in graph.ranks:
+                        expected = graph_type(n, 3, data, vectorized=False)
+
+                        self.assertEqual(
+                            list(expected.getGraph().edges(data=True)),
+                            list(graph[n].getGraph().edges(data=True)),
+                        )
+
+    def test_similarity(self):
+        graph1 = MultiRankNGramGraph((1, 2, 3), 2, self.text1)
+        graph2 = MultiRankNGramGraph((1, 2, 3), 2, self.text2)
+
+        metric = SimilarityMultiRank(weights={1: 1, 2: 1, 3: 2})
+
+        self.assertEqual(
+            metric(graph1, MultiRankNGramGraph((1, 2, 3), 2, self.text1)), 1.0
+        )
+
+        nvs = SimilarityNVS()
+        self.assertAlmostEqual(
+            metric(graph1, graph2),
+            (
+                nvs(graph1[1], graph2[1])
+                + nvs(graph1[2], graph2[2])
+                + 2 * nvs(graph1[3], graph2[3])
+            )
+            / 4,
+        )
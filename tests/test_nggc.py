@@ -28,3 +28,12 @@ class NGramGraphCollectorTestCase(BaseTestCase):
                 self.assertAlmostEqual(
                     self.collector.appropriateness_of(entry), expected, places=3
                 )
+
+    def test_max_edges(self):
+        collector = NGramGraphCollector(max_edges=10)
+
+        for entry in self.train_data:
+            collector.add(entry)
+
+        self.assertLessEqual(len(collector._representative_graph), 10)
+        self.assertGreater(collector.appropriateness_of(self.train_data[1]), 0)
@@ -0,0 +1,93 @@
+import os
+import tempfile
+
+import numpy as np
+
+from pyinsect.documentModel.comparators.NGramGraphSimilarity import (
+    Similarity,
+    SimilarityNVS,
+)
+from pyinsect.documentModel.representations import DocumentNGramSymWinGraph
+from pyinsect.documentModel.representations.DocumentNGramGraph import DocumentNGramGraph
+from pyinsect.indexing.pairwise import all_pairs_similarity
+from pyinsect.structs.vocabulary import Vocabulary
+from tests.base import BaseParallelTestCase, BaseTestCase
+
+documents = [
+    "abcdefabcdef",
+    "",
+    "ab",
+    "the quick brown fox",
+    "fox the quick",
+    "the quick brown fox jumps over the lazy dog",
+    "abcabc",
+]
+
+
+class LengthRatio(Similarity):
+    """A similarity that is not commutative."""
+
+    def __init__(self):
+        super().__init__(commutative=False)
+
+    def getSimilarityDouble(self, ngg1, ngg2):
+        return len(ngg1) / (len(ngg2) + 1.0)
+
+
+def _expected(graphs, metric):
+    return np.array(
+        [[metric(graph1, graph2) for graph2 in graphs] for graph1 in graphs],
+        np.float32,
+    )
+
+
+class AllPairsSimilarityTestCase(BaseTestCase):
+    def test_in_process(self):
+        vocabulary = Vocabulary()
+
+        for graphs in (
+            [DocumentNGramGraph(3, 3, d, vocabulary=vocabulary) for d in documents],
+            [DocumentNGramSymWinGraph(3, 3, d) for d in documents],
+        ):
+            for metric in (SimilarityNVS(), LengthRatio()):
+                for block_size in (1, 3, 100):
+                    with self.subTest(metric=metric, block_size=block_size):
+                        np.testing.assert_allclose(
+                            all_pairs_similarity(
+                                graphs, metric, workers=0, block_size=block_size
+                            ),
+                            _expected(graphs, metric),
+                            rtol=1e-6,
+                        )
+
+    def test_output(self):
+        graphs = [DocumentNGramGraph(3, 3, d) for d in documents]
+        expected = _expected(graphs, SimilarityNVS())
+
+        out = np.zeros((len(graphs), len(graphs)), np.float32)
+        self.assertIs(all_pairs_similarity(graphs, workers=0, out=out), out)
+        np.testing.assert_allclose(out, expected, rtol=1e-6)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "similarities.npy")
+            all_pairs_similarity(graphs, workers=0, block_size=2, out=path)
+
+            np.testing.assert_allclose(np.load(path), expected, rtol=1e-6)
+
+        with self.assertRaises(ValueError):
+            all_pairs_similarity(graphs, workers=0, out=np.zeros((2, 2)))
+
+
+class ParallelAllPairsSimilarityTestCase(BaseParallelTestCase):
+    def test_pool(self):
+        graphs = [DocumentNGramGraph(3, 3, d) for d in documents]
+
+        for metric in (SimilarityNVS(), LengthRatio()):
+            with self.subTest(metric=metric):
+                np.testing.assert_allclose(
+                    all_pairs_similarity(
+                        graphs, metric, pool=self.pool, block_size=2, max_pending=2
+                    ),
+                    _expected(graphs, metric),
+                    rtol=1e-6,
+                )
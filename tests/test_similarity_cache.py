@@ -0,0 +1,89 @@
+from pyinsect.documentModel.comparators import (
+    CachedSimilarity,
+    SimilarityCache,
+    SimilarityHPG,
+    SimilarityNVS,
+    SimilarityVS,
+)
+from pyinsect.documentModel.representations.DocumentNGramGraph import DocumentNGramGraph
+from tests.base import BaseTestCase
+
+
+class SimilarityCacheTestCase(BaseTestCase):
+    def test_lru(self):
+        cache = SimilarityCache(max_size=2)
+
+        cache.set("a", 1.0)
+        cache.set("b", 2.0)
+        self.assertEqual(cache.get("a"), 1.0)
+
+        # "b" is the least recently used
+        cache.set("c", 3.0)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1.0)
+        self.assertEqual(cache.get("c"), 3.0)
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+    def test_max_bytes(self):
+        cache = SimilarityCache(max_size=None, max_bytes=1)
+
+        cache.set(("key",), 1.0)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.nbytes, 0)
+
+
+class CachedSimilarityTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.graph1 = DocumentNGramGraph(3, 2, "abcdefgh")
+        self.graph2 = DocumentNGramGraph(3, 2, "abcdxyz", compact=True)
+
+    def test_same_as_metric(self):
+        metric = SimilarityNVS()
+        cached = CachedSimilarity(metric)
+
+        for _ in range(2):
+            self.assertEqual(
+                cached(self.graph1, self.graph2), metric(self.graph1, self.graph2)
+            )
+            self.assertEqual(
+                cached.getSimilarityComponents(self.graph2, self.graph1),
+                metric.getSimilarityComponents(self.graph2, self.graph1),
+            )
+
+        self.assertEqual((cached.cache.hits, cached.cache.misses), (2, 2))
+
+        # (graph2, graph1) is found under (graph1, graph2)
+        cached(self.graph2, self.graph1)
+        self.assertEqual((cached.cache.hits, cached.cache.misses), (3, 2))
+
+    def test_mutations(self):
+        cached = CachedSimilarity(SimilarityVS())
+
+        for graph in (self.graph1, self.graph2):
+            other = DocumentNGramGraph(3, 2, "abcdefgh")
+            self.assertEqual(cached(graph, other), SimilarityVS()(graph, other))
+
+            graph.setEdge(("a", "b", "c"), ("b", "c", "d"), 5)
+            self.assertEqual(cached(graph, other), SimilarityVS()(graph, other))
+
+            graph.delEdge(("a", "b", "c"), ("b", "c", "d"))
+            self.assertEqual(cached(graph, other), SimilarityVS()(graph, other))
+
+            graph.union(DocumentNGramGraph(3, 2, "uvwxyz"))
+            self.assertEqual(cached(graph, other), SimilarityVS()(graph, other))
+
+    def test_shared_by_hpg_levels(self):
+        cache = SimilarityCache()
+        metric = SimilarityHPG(CachedSimilarity(SimilarityNVS(), cache))
+
+        levels1 = [self.graph1, self.graph2]
+        levels2 = [self.graph2, self.graph1]
+
+        self.assertEqual(
+            metric(levels1, levels2), SimilarityHPG(SimilarityNVS())(levels1, levels2)
+        )
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
@@ -0,0 +1,79 @@
+import os
+import tempfile
+
+import numpy as np
+
+from pyinsect.documentModel.comparators import (
+    EdgeMinHash,
+    SimilarityEstimate,
+    SimilarityNVS,
+    SimilarityVS,
+)
+from pyinsect.documentModel.representations import DocumentNGramSymWinGraph
+from pyinsect.documentModel.representations.DocumentNGramGraph import DocumentNGramGraph
+from pyinsect.structs.vocabulary import Vocabulary
+from tests.base import BaseTestCase
+
+
+class EdgeMinHashTestCase(BaseTestCase):
+    documents = [
+        "the quick brown fox jumps over the lazy dog",
+        "the quick brown fox jumped over the lazy dogs",
+        "a quick brown dog jumps over the lazy fox",
+        "lorem ipsum dolor sit amet",
+        "",
+    ]
+
+    def setUp(self):
+        super().setUp()
+
+        self.sketcher = EdgeMinHash(size=1024)
+        self.graphs = [DocumentNGramGraph(3, 3, d) for d in self.documents]
+
+    def test_same_sketch_for_any_vocabulary(self):
+        vocabulary = Vocabulary()
+
+        for graph_type in (DocumentNGramGraph, DocumentNGramSymWinGraph):
+            for document in self.documents:
+                with self.subTest(graph_type=graph_type, document=document):
+                    sketch = self.sketcher.sketch(graph_type(3, 3, document))
+                    compact = self.sketcher.sketch(
+                        graph_type(3, 3, document, vocabulary=vocabulary)
+                    )
+
+                    self.assertEqual(sketch.tobytes(), compact.tobytes())
+
+    def test_estimates(self):
+        sketches = self.sketcher.sketch_many(self.graphs)
+
+        for metric, exact in (("VS", SimilarityVS()), ("NVS", SimilarityNVS())):
+            estimate = SimilarityEstimate(metric, self.sketcher)
+
+            for index, graph in enumerate(self.graphs):
+                similarities = estimate.similarities(sketches[index], sketches)
+
+                for other, similarity in zip(self.graphs, similarities):
+                    with self.subTest(metric=metric, graph=graph, other=other):
+                        expected = exact(graph, other)
+
+                        self.assertAlmostEqual(similarity, expected, delta=0.1)
+                        self.assertAlmostEqual(
+                            estimate(sketches[index], self.sketcher.sketch(other)),
+                            similarity,
+                        )
+
+                # a graph with itself, and with a disjoint graph
+                self.assertEqual(estimate(graph, graph), exact(graph, graph))
+                if index != 3:
+                    self.assertEqual(estimate(graph, self.graphs[3]), 0.0)
+
+    def test_save(self):
+        sketches = self.sketcher.sketch_many(self.graphs)
+
+        self.assertEqual(sketches.nbytes, len(self.graphs) * (8 * 1024 + 16))
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "sketches.npy")
+            np.save(path, sketches)
+
+            self.assertEqual(np.load(path).tobytes(), sketches.tobytes())